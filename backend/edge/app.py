@@ -1,26 +1,41 @@
 from __future__ import annotations
 
+import base64
+import binascii
 import hashlib
+import hmac
 import json
+import mimetypes
 import os
+import re
 import socket
 import threading
 import time
 import uuid
-from contextlib import contextmanager
-from datetime import datetime, timezone
-from typing import Any, Dict, Generator, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, Generator, List, Optional, Set, Tuple, Union
 from urllib.parse import quote
 from urllib.request import Request, urlopen
 
+import anyio.to_thread
 import mysql.connector
+import orjson
+from mysql.connector.constants import ClientFlag
+from mysql.connector.errors import PoolError
+from mysql.connector.pooling import MySQLConnectionPool
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Header, HTTPException, Query, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
 from PIL import Image
 
-from .auth import create_access_token, decode_access_token, hash_password, require_role, verify_password
+from .auth import create_access_token, decode_access_token_cached, hash_password, require_role, verify_password
+from .cache import SWRCache, TTLCache
 from .thermal_print import print_ticket
 
 load_dotenv()
@@ -30,63 +45,178 @@ DB_PORT = int(os.getenv("DB_PORT", "3306"))
 DB_USER = os.getenv("DB_USER", "mysql")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "mysql")
 DB_NAME = os.getenv("DB_NAME", "chamador")
+# Conexões mantidas abertas no pool (mysql-connector limita a 32)
+DB_POOL_SIZE = max(1, min(32, int(os.getenv("DB_POOL_SIZE", "16"))))
+# Réplica de leitura para o dashboard admin (vazio: dashboard usa o banco principal)
+DB_RO_HOST = os.getenv("DB_RO_HOST", "").strip()
+DB_RO_PORT = int(os.getenv("DB_RO_PORT", str(DB_PORT)))
 
 APP_HOST = os.getenv("EDGE_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("EDGE_PORT", "7071"))
+# Rotas síncronas rodam no threadpool do anyio (padrão dele: 40 threads); cada thread ocupa
+# no máximo uma conexão, então o excedente ao DB_POOL_SIZE vira conexão avulsa (db_conn)
+EDGE_THREADPOOL_SIZE = max(1, int(os.getenv("EDGE_THREADPOOL_SIZE", "64")))
 
 DEVICE_TOKEN = os.getenv("EDGE_DEVICE_TOKEN", "dev-edge-token")
+_DEVICE_TOKEN_BYTES = DEVICE_TOKEN.encode("utf-8")
 EDGE_TENANT_CPF_CNPJ = os.getenv("EDGE_TENANT_CPF_CNPJ")  # optional: pin tenant on this edge instance
 MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+# Tempo (s) em que o /tv/state montado é reaproveitado entre TVs que fazem polling
+TV_STATE_CACHE_TTL = float(os.getenv("TV_STATE_CACHE_TTL", "0.75"))
+OEMBED_TIMEOUT = float(os.getenv("OEMBED_TIMEOUT", "3"))
+TENANT_CACHE_TTL = float(os.getenv("TENANT_CACHE_TTL", "60"))
+DASHBOARD_LIVE_TTL = float(os.getenv("DASHBOARD_LIVE_TTL", "5"))
+DASHBOARD_KPIS_TTL = float(os.getenv("DASHBOARD_KPIS_TTL", "60"))
+PLAYLIST_CACHE_TTL = float(os.getenv("PLAYLIST_CACHE_TTL", "30"))
+TENANT_LISTS_CACHE_TTL = float(os.getenv("TENANT_LISTS_CACHE_TTL", "300"))
+QUEUE_STATS_CACHE_TTL = float(os.getenv("QUEUE_STATS_CACHE_TTL", "30"))
 
 
 def utc_now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def utc_today() -> date:
+    """Data de hoje em UTC: o mesmo dia de issued_at/completed_at, event_date e do rollup diário."""
+    return utc_now().date()
+
+
 _DEFAULT_DB = object()
 
+_POOL: Optional[MySQLConnectionPool] = None
+_RO_POOL: Optional[MySQLConnectionPool] = None
+_POOL_LOCK = threading.Lock()
+# Contadores do pool para o /health (protegidos por _POOL_LOCK)
+_pool_stats = {"in_use": 0, "overflow_in_use": 0, "overflow_total": 0}
 
-@contextmanager
-def db_conn(database: Optional[str] | object = _DEFAULT_DB):
-    kwargs = {
+
+def _db_kwargs() -> Dict[str, Any]:
+    return {
         "host": DB_HOST,
         "port": DB_PORT,
         "user": DB_USER,
         "password": DB_PASSWORD,
         "autocommit": True,
+        # rowcount de UPDATE = linhas encontradas pelo WHERE (não só as alteradas): rowcount 0 significa 404
+        "client_flags": [ClientFlag.FOUND_ROWS],
     }
+
+
+def _get_pool() -> MySQLConnectionPool:
+    """Pool criado sob demanda: o banco pode ainda não existir no import (antes das migrations)."""
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                _POOL = MySQLConnectionPool(
+                    pool_name="edge",
+                    pool_size=DB_POOL_SIZE,
+                    database=DB_NAME,
+                    **_db_kwargs(),
+                )
+    return _POOL
+
+
+@contextmanager
+def db_conn(database: Optional[str] | object = _DEFAULT_DB):
+    kwargs = _db_kwargs()
+    stat = None
     if database is _DEFAULT_DB:
-        kwargs["database"] = DB_NAME
-    elif database is None:
-        # server-level connection (no database selected)
-        pass
+        try:
+            conn = _get_pool().get_connection()
+            stat = "in_use"
+        except PoolError:
+            # Pool esgotado: abre conexão avulsa em vez de falhar a requisição
+            conn = mysql.connector.connect(database=DB_NAME, **kwargs)
+            stat = "overflow_in_use"
+        with _POOL_LOCK:
+            _pool_stats[stat] += 1
+            if stat == "overflow_in_use":
+                _pool_stats["overflow_total"] += 1
     else:
-        kwargs["database"] = database
-    conn = mysql.connector.connect(**kwargs)
+        if database is not None:
+            kwargs["database"] = database
+        # database=None: server-level connection (no database selected)
+        conn = mysql.connector.connect(**kwargs)
     try:
         yield conn
     finally:
+        # Conexão do pool: close() devolve ao pool
         conn.close()
+        if stat:
+            with _POOL_LOCK:
+                _pool_stats[stat] -= 1
+
+
+def _get_ro_pool() -> MySQLConnectionPool:
+    global _RO_POOL
+    if _RO_POOL is None:
+        with _POOL_LOCK:
+            if _RO_POOL is None:
+                kwargs = _db_kwargs()
+                kwargs.update(host=DB_RO_HOST, port=DB_RO_PORT)
+                # Sessão somente leitura definida na conexão; sem reset ao devolver ao pool
+                # (as consultas de leitura não deixam estado de sessão), então vale para sempre
+                _RO_POOL = MySQLConnectionPool(
+                    pool_name="edge_ro",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=False,
+                    database=DB_NAME,
+                    init_command="SET SESSION TRANSACTION READ ONLY",
+                    **kwargs,
+                )
+    return _RO_POOL
+
+
+@contextmanager
+def db_conn_ro():
+    """Conexão para consultas só de leitura (dashboard): réplica em DB_RO_HOST, se configurada.
+
+    Sem réplica, ou com o pool da réplica esgotado, usa db_conn() (banco principal).
+    """
+    conn = None
+    if DB_RO_HOST:
+        try:
+            conn = _get_ro_pool().get_connection()
+        except PoolError:
+            pass
+    if conn is None:
+        with db_conn() as conn:
+            yield conn
+        return
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats() -> Dict[str, int]:
+    """Uso do pool de conexões: em uso, avulsas (pool esgotado) abertas agora e total desde o start."""
+    with _POOL_LOCK:
+        return {"size": DB_POOL_SIZE, **_pool_stats}
 
 
 def require_token(auth_header: Optional[str]):
     # Simple MVP auth: Bearer token shared between TV/Test UI and Edge.
     if not auth_header:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
-    if not auth_header.lower().startswith("bearer "):
+    if auth_header[:7].lower() != "bearer ":
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
-    token = auth_header.split(" ", 1)[1].strip()
-    if token != DEVICE_TOKEN:
+    if not device_token_matches(auth_header[7:].strip()):
         raise HTTPException(status_code=403, detail="Invalid token")
 
 
+def device_token_matches(token: str) -> bool:
+    # Comparação em tempo constante (evita vazar o token compartilhado por timing)
+    return hmac.compare_digest(token.encode("utf-8"), _DEVICE_TOKEN_BYTES)
+
+
 def require_jwt(auth_header: Optional[str]) -> Dict[str, Any]:
     if not auth_header:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
-    if not auth_header.lower().startswith("bearer "):
+    if auth_header[:7].lower() != "bearer ":
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
-    token = auth_header.split(" ", 1)[1].strip()
-    return decode_access_token(token)
+    return decode_access_token_cached(auth_header[7:].strip())
 
 
 def tenant_from_jwt(payload: Dict[str, Any]) -> str:
@@ -96,6 +226,44 @@ def tenant_from_jwt(payload: Dict[str, Any]) -> str:
     return str(tenant)
 
 
+ADMIN_ROLES = frozenset({"admin"})
+
+# Flags booleanas do JSON (ativo/habilitado) -> TINYINT; None conta como falso (mesmo que `1 if v else 0`)
+_BIT_VALUES: Dict[Any, int] = {True: 1, False: 0, None: 0, "1": 1, "0": 0, "true": 1, "false": 0}
+
+
+def str_field(payload_in: Dict[str, Any], key: str, default: str = "") -> str:
+    """Campo texto do JSON sem espaços nas pontas; ausente, nulo ou em branco vira `default`."""
+    value = payload_in.get(key)
+    if not value:
+        return default
+    if not isinstance(value, str):
+        raise HTTPException(status_code=400, detail=f"{key} must be a string")
+    return value.strip() or default
+
+
+def to_bit(value: Any, field: str) -> int:
+    """Converte a flag para 0/1 com uma busca no dict; valor não booleano (ex.: "sim", [1]) vira 400."""
+    try:
+        bit = _BIT_VALUES.get(value.lower() if isinstance(value, str) else value)
+    except TypeError:  # list/dict: não hasheável
+        bit = None
+    if bit is None:
+        raise HTTPException(status_code=400, detail=f"{field} must be a boolean")
+    return bit
+
+
+async def admin_tenant(authorization: Optional[str] = Header(default=None)) -> str:
+    """Dependência das rotas do admin do tenant: valida o JWT (role admin) e retorna o tenant.
+
+    `async` de propósito: com o cache de JWT é só um hash e uma consulta ao dict, então roda no
+    event loop em vez de ocupar mais uma passagem pelo threadpool antes do handler.
+    """
+    payload = require_jwt(authorization)
+    require_role(payload, ADMIN_ROLES)
+    return tenant_from_jwt(payload)
+
+
 def ensure_database_exists():
     with db_conn(database=None) as conn:
         cur = conn.cursor()
@@ -121,16 +289,15 @@ def list_migration_files() -> List[Tuple[str, str]]:
     Returns list of (version, filepath) sorted by version asc.
     File pattern: 001_init.sql -> version '001'
     """
-    if not os.path.isdir(MIGRATIONS_DIR):
-        return []
     items: List[Tuple[str, str]] = []
-    for name in os.listdir(MIGRATIONS_DIR):
-        if not name.endswith(".sql"):
-            continue
-        prefix = name.split("_", 1)[0]
-        if not prefix.isdigit():
-            continue
-        items.append((prefix, os.path.join(MIGRATIONS_DIR, name)))
+    try:
+        with os.scandir(MIGRATIONS_DIR) as it:
+            for entry in it:
+                prefix = entry.name.split("_", 1)[0]
+                if entry.name.endswith(".sql") and prefix.isdigit() and entry.is_file():
+                    items.append((prefix, entry.path))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
     items.sort(key=lambda x: int(x[0]))
     return items
 
@@ -145,10 +312,17 @@ def applied_migrations(conn) -> Set[str]:
 def apply_sql_file(conn, filepath: str):
     with open(filepath, "r", encoding="utf-8") as f:
         sql = f.read()
-    statements = [s.strip() for s in sql.split(";") if s.strip()]
+    if not sql.strip():
+        return
+    # Arquivo inteiro em um único execute() (multi-statement, uma ida ao banco). O conector
+    # separa os comandos respeitando strings, comentários e DELIMITER (triggers/procedures).
     cur = conn.cursor()
-    for stmt in statements:
-        cur.execute(stmt)
+    cur.execute(sql)
+    while True:
+        if cur.with_rows:
+            cur.fetchall()
+        if not cur.nextset():
+            break
 
 
 def run_migrations(reset: bool = False) -> Dict[str, Any]:
@@ -164,19 +338,61 @@ def run_migrations(reset: bool = False) -> Dict[str, Any]:
 
     applied_now: List[str] = []
     with db_conn() as conn:
-        ensure_migrations_table(conn)
         already = applied_migrations(conn)
         for version, path in files:
             if version in already:
                 continue
             apply_sql_file(conn, path)
+            # Registrada logo após aplicar: DDL faz commit implícito, então um registro em lote
+            # no final reaplicaria migrations já executadas se uma posterior falhasse.
             cur = conn.cursor()
             cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
             applied_now.append(version)
+    _invalidate_tenant()
     return {"ok": True, "applied": applied_now}
 
 
-app = FastAPI(title="Chamador Edge API", version="0.1.0")
+def _json_default(obj: Any) -> Any:
+    # Mesmo tratamento do jsonable_encoder do FastAPI para Decimal (SUM/AVG do MySQL, tts_speed...)
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dump_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=_json_default)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse serializada com orjson (datetime em C). Retornar a instância pula o jsonable_encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Dimensiona o threadpool e abre as conexões do pool no start, e não na primeira requisição.
+
+    Se o banco ainda não existe (antes das migrations), o pool continua sendo criado sob demanda.
+    """
+    anyio.to_thread.current_default_thread_limiter().total_tokens = EDGE_THREADPOOL_SIZE
+    try:
+        await run_in_threadpool(_get_pool)
+        if DB_RO_HOST:
+            await run_in_threadpool(_get_ro_pool)
+    except mysql.connector.Error:
+        pass
+    yield
+
+
+# Todas as rotas serializam com orjson; as que devolvem ORJSONResponse direto pulam também o jsonable_encoder
+app = FastAPI(
+    title="Chamador Edge API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -187,14 +403,28 @@ app.add_middleware(
 )
 
 
+_LAN_IP_TTL = 300.0
+_lan_ip: Optional[str] = None
+_lan_ip_checked_at = float("-inf")
+
+
 def _get_lan_ip() -> Optional[str]:
-    """IP da interface usada para a rota padrão (útil para QR no dashboard)."""
+    """IP da interface usada para a rota padrão (útil para QR no dashboard).
+
+    Reavaliado a cada 5 min; se a descoberta falhar, mantém o último IP conhecido.
+    """
+    global _lan_ip, _lan_ip_checked_at
+    now = time.monotonic()
+    if now - _lan_ip_checked_at < _LAN_IP_TTL:
+        return _lan_ip
+    _lan_ip_checked_at = now
     try:
         with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
             s.connect(("8.8.8.8", 80))
-            return s.getsockname()[0]
+            _lan_ip = s.getsockname()[0]
     except Exception:
-        return None
+        pass
+    return _lan_ip
 
 
 @app.get("/health")
@@ -203,7 +433,7 @@ def health():
         cur = conn.cursor()
         cur.execute("SELECT 1")
         cur.fetchone()
-    return {"ok": True, "time": utc_now().isoformat()}
+    return {"ok": True, "time": utc_now().isoformat(), "db_pool": pool_stats()}
 
 
 @app.get("/api/host")
@@ -229,344 +459,371 @@ def migrate(reset: bool = Query(default=False), authorization: Optional[str] = H
 @app.post("/admin/seed")
 def seed(authorization: Optional[str] = Header(default=None)):
     require_token(authorization)
+    tenant_cpf_cnpj = EDGE_TENANT_CPF_CNPJ or "10230480000130"
+    t = tenant_cpf_cnpj
+    msg1 = "INFORMATIVO: Atendimento até às 19h durante o mês de Dezembro."
+    msg2 = "AVISO: Tenha em mãos seu documento para agilizar o atendimento."
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
 
-        tenant_cpf_cnpj = EDGE_TENANT_CPF_CNPJ or "10230480000130"
-        cur.execute("SELECT cpf_cnpj FROM tenants WHERE cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if not cur.fetchone():
-            cur.execute(
-                """
-                INSERT INTO tenants (cpf_cnpj, nome_razao_social, nome_fantasia, situacao, logo_base64)
-                VALUES (%s, %s, %s, 'ativo', NULL)
-                """,
-                (tenant_cpf_cnpj, "FERREIRA COSTA & CIA LTDA", "FERREIRA COSTA"),
-            )
+        # Todas as verificações de existência em uma única ida ao banco
+        (
+            tenant_rows,
+            youtube_count,
+            announcements_count,
+            tenant_announcements_count,
+            users_count,
+            counters_count,
+            services_count,
+        ) = fetch_result_sets(
+            cur,
+            (
+                "SELECT cpf_cnpj FROM tenants WHERE cpf_cnpj = %s",
+                "SELECT COUNT(*) AS c FROM youtube_urls WHERE tenant_cpf_cnpj = %s",
+                "SELECT COUNT(*) AS c FROM announcements",
+                "SELECT COUNT(*) AS c FROM tenant_announcements WHERE tenant_cpf_cnpj = %s",
+                "SELECT COUNT(*) AS c FROM tenant_users WHERE tenant_cpf_cnpj = %s",
+                "SELECT COUNT(*) AS c FROM counters WHERE tenant_cpf_cnpj = %s",
+                "SELECT COUNT(*) AS c FROM services WHERE tenant_cpf_cnpj = %s",
+            ),
+            (t,) * 6,
+        )
 
-        cur.execute("SELECT COUNT(*) AS c FROM youtube_urls WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            cur.execute(
-                """
-                INSERT INTO youtube_urls (id, tenant_cpf_cnpj, url, title, position, enabled)
-                VALUES
-                  (UUID(), %s, %s, %s, 1, 1),
-                  (UUID(), %s, %s, %s, 2, 1)
-                """,
-                (
-                    tenant_cpf_cnpj,
-                    "https://www.youtube.com/watch?v=G0YWhbsBuRc",
-                    "Vídeo 1 (tenant)",
-                    tenant_cpf_cnpj,
-                    "https://www.youtube.com/watch?v=CK4b9_0tQOk",
-                    "Vídeo 2 (tenant)",
-                ),
-            )
+        def empty(rows: List[Dict[str, Any]]) -> bool:
+            return (rows[0] if rows else {}).get("c", 0) == 0
 
-        cur.execute("SELECT COUNT(*) AS c FROM announcements")
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            cur.execute(
-                """
-                INSERT INTO announcements (id, message, position, enabled)
-                VALUES
-                  (UUID(), 'INFORMATIVO: Atendimento até às 19h durante o mês de Dezembro.', 1, 1),
-                  (UUID(), 'AVISO: Tenha em mãos seu documento para agilizar o atendimento.', 2, 1)
-                """
-            )
+        # Inserts em uma única transação; executemany agrupa as linhas em um INSERT multi-row.
+        # IDs gerados no Python (mesmo formato CHAR(36) do UUID()), como no restante da API.
+        conn.start_transaction()
+        try:
+            if not tenant_rows:
+                cur.execute(
+                    """
+                    INSERT INTO tenants (cpf_cnpj, nome_razao_social, nome_fantasia, situacao, logo_base64)
+                    VALUES (%s, %s, %s, 'ativo', NULL)
+                    """,
+                    (t, "FERREIRA COSTA & CIA LTDA", "FERREIRA COSTA"),
+                )
 
-        # Tenant announcements (ticker) - per tenant
-        cur.execute("SELECT COUNT(*) AS c FROM tenant_announcements WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            cur2 = conn.cursor()
-            cur2.execute(
-                """
-                INSERT INTO tenant_announcements (id, tenant_cpf_cnpj, message, position, enabled)
-                VALUES
-                  (UUID(), %s, %s, 1, 1),
-                  (UUID(), %s, %s, 2, 1)
-                """,
-                (
-                    tenant_cpf_cnpj,
-                    "INFORMATIVO: Atendimento até às 19h durante o mês de Dezembro.",
-                    tenant_cpf_cnpj,
-                    "AVISO: Tenha em mãos seu documento para agilizar o atendimento.",
-                ),
-            )
+            if empty(youtube_count):
+                cur.executemany(
+                    "INSERT INTO youtube_urls (id, tenant_cpf_cnpj, url, title, position, enabled) VALUES (%s, %s, %s, %s, %s, 1)",
+                    [
+                        (str(uuid.uuid4()), t, "https://www.youtube.com/watch?v=G0YWhbsBuRc", "Vídeo 1 (tenant)", 1),
+                        (str(uuid.uuid4()), t, "https://www.youtube.com/watch?v=CK4b9_0tQOk", "Vídeo 2 (tenant)", 2),
+                    ],
+                )
 
-        # Users (admin/operator) for portal/operator UI
-        cur.execute("SELECT COUNT(*) AS c FROM tenant_users WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            admin_hash = hash_password("admin123")
-            op_hash = hash_password("amanda123")
-            cur2 = conn.cursor()
-            cur2.execute(
-                """
-                INSERT INTO tenant_users (id, tenant_cpf_cnpj, email, full_name, role, password_hash, active)
-                VALUES
-                  (UUID(), %s, %s, %s, 'admin', %s, 1),
-                  (UUID(), %s, %s, %s, 'operator', %s, 1)
-                """,
-                (
-                    tenant_cpf_cnpj,
-                    "admin@ferreiracosta.com.br",
-                    "Admin Ferreira Costa",
-                    admin_hash,
-                    tenant_cpf_cnpj,
-                    "amanda@ferreiracosta.com.br",
-                    "Amanda Operadora",
-                    op_hash,
-                ),
-            )
+            if empty(announcements_count):
+                cur.executemany(
+                    "INSERT INTO announcements (id, message, position, enabled) VALUES (%s, %s, %s, 1)",
+                    [(str(uuid.uuid4()), msg1, 1), (str(uuid.uuid4()), msg2, 2)],
+                )
 
-        # Basic counters and services
-        cur.execute("SELECT COUNT(*) AS c FROM counters WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            cur2 = conn.cursor()
-            cur2.execute(
-                """
-                INSERT INTO counters (id, tenant_cpf_cnpj, name, active)
-                VALUES
-                  (UUID(), %s, 'Guichê 01', 1),
-                  (UUID(), %s, 'Guichê 02', 1),
-                  (UUID(), %s, 'Guichê 03', 1)
-                """,
-                (tenant_cpf_cnpj, tenant_cpf_cnpj, tenant_cpf_cnpj),
-            )
+            # Tenant announcements (ticker) - per tenant
+            if empty(tenant_announcements_count):
+                cur.executemany(
+                    "INSERT INTO tenant_announcements (id, tenant_cpf_cnpj, message, position, enabled) VALUES (%s, %s, %s, %s, 1)",
+                    [(str(uuid.uuid4()), t, msg1, 1), (str(uuid.uuid4()), t, msg2, 2)],
+                )
 
-        cur.execute("SELECT COUNT(*) AS c FROM services WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        if (cur.fetchone() or {}).get("c", 0) == 0:
-            cur2 = conn.cursor()
-            cur2.execute(
-                """
-                INSERT INTO services (id, tenant_cpf_cnpj, name, priority_mode, active)
-                VALUES
-                  (UUID(), %s, 'Atendimento', 'normal', 1),
-                  (UUID(), %s, 'Preferencial', 'preferential', 1)
-                """,
-                (tenant_cpf_cnpj, tenant_cpf_cnpj),
-            )
+            # Users (admin/operator) for portal/operator UI
+            if empty(users_count):
+                # bcrypt libera o GIL: os dois hashes (~200 ms cada) rodam em paralelo
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    admin_hash, op_hash = pool.map(hash_password, ("admin123", "amanda123"))
+                cur.executemany(
+                    "INSERT INTO tenant_users (id, tenant_cpf_cnpj, email, full_name, role, password_hash, active) VALUES (%s, %s, %s, %s, %s, %s, 1)",
+                    [
+                        (str(uuid.uuid4()), t, "admin@ferreiracosta.com.br", "Admin Ferreira Costa", "admin", admin_hash),
+                        (str(uuid.uuid4()), t, "amanda@ferreiracosta.com.br", "Amanda Operadora", "operator", op_hash),
+                    ],
+                )
+
+            # Basic counters and services
+            if empty(counters_count):
+                cur.executemany(
+                    "INSERT INTO counters (id, tenant_cpf_cnpj, name, active) VALUES (%s, %s, %s, 1)",
+                    [(str(uuid.uuid4()), t, f"Guichê {n:02d}") for n in (1, 2, 3)],
+                )
 
+            if empty(services_count):
+                cur.executemany(
+                    "INSERT INTO services (id, tenant_cpf_cnpj, name, priority_mode, active) VALUES (%s, %s, %s, %s, 1)",
+                    [(str(uuid.uuid4()), t, "Atendimento", "normal"), (str(uuid.uuid4()), t, "Preferencial", "preferential")],
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    _invalidate_tenant()
+    invalidate_playlist()
+    invalidate_tenant_list()
+    invalidate_tv_state()
     return {"ok": True}
 
 
+# Support:
+# - https://www.youtube.com/watch?v=ID
+# - https://youtu.be/ID
+# - https://www.youtube.com/embed/ID
+# - https://www.youtube.com/shorts/ID
+_YT_ID_RE = re.compile(r"(?:youtu\.be/|/embed/|/shorts/|[?&]v=)([A-Za-z0-9_-]{6,})")
+
+
+@lru_cache(maxsize=512)
 def extract_youtube_id(url: str) -> Optional[str]:
-    url = (url or "").strip()
-    if not url:
-        return None
-    # Support:
-    # - https://www.youtube.com/watch?v=ID
-    # - https://youtu.be/ID
-    # - https://www.youtube.com/embed/ID
-    # - https://www.youtube.com/shorts/ID
-    if "youtu.be/" in url:
-        part = url.split("youtu.be/", 1)[1]
-        vid = part.split("?", 1)[0].split("&", 1)[0].strip()
-        return vid or None
-    if "/embed/" in url:
-        part = url.split("/embed/", 1)[1]
-        vid = part.split("?", 1)[0].split("&", 1)[0].strip().strip("/")
-        return vid or None
-    if "/shorts/" in url:
-        part = url.split("/shorts/", 1)[1]
-        vid = part.split("?", 1)[0].split("&", 1)[0].strip().strip("/")
-        return vid or None
-    if "watch?v=" in url:
-        part = url.split("watch?v=", 1)[1]
-        vid = part.split("&", 1)[0].strip()
-        return vid or None
-    return None
+    # Memoizado: as mesmas URLs da playlist reaparecem a cada poll do /tv/state
+    m = _YT_ID_RE.search((url or "").strip())
+    return m.group(1) if m else None
+
+
+_oembed_cache: Optional[Dict[str, Dict[str, Any]]] = None
+_oembed_lock = threading.Lock()
+
+
+def _oembed_cache_path() -> str:
+    return os.path.join(os.getcwd(), ".run", "oembed_cache.json")
+
+
+def _load_oembed_cache() -> Dict[str, Dict[str, Any]]:
+    global _oembed_cache
+    if _oembed_cache is None:
+        try:
+            with open(_oembed_cache_path(), "r", encoding="utf-8") as f:
+                _oembed_cache = json.load(f)
+        except Exception:
+            _oembed_cache = {}
+    return _oembed_cache
 
 
 def fetch_youtube_oembed(video_url: str) -> Dict[str, Any]:
     """
     Fetch YouTube metadata via oEmbed (no API key).
     Returns dict with keys: title, author_name, thumbnail_url (best effort).
+    Respostas são guardadas em memória e em .run/oembed_cache.json (metadados não mudam);
+    falhas não são cacheadas.
     """
+    with _oembed_lock:
+        cached = _load_oembed_cache().get(video_url)
+    if cached is not None:
+        return dict(cached)
     # https://www.youtube.com/oembed?url=...&format=json
     oembed_url = f"https://www.youtube.com/oembed?url={quote(video_url, safe='')}&format=json"
     req = Request(oembed_url, headers={"User-Agent": "Chamador/1.0 (+oEmbed)"})
     try:
-        with urlopen(req, timeout=6) as resp:
+        with urlopen(req, timeout=OEMBED_TIMEOUT) as resp:
             raw = resp.read().decode("utf-8", errors="replace")
         data = json.loads(raw)
-        return {
+        meta = {
             "title": data.get("title"),
             "author_name": data.get("author_name"),
             "thumbnail_url": data.get("thumbnail_url"),
         }
     except Exception:
         return {}
+    with _oembed_lock:
+        cache = _load_oembed_cache()
+        cache[video_url] = meta
+        try:
+            path = _oembed_cache_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cache, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception:
+            pass
+    return dict(meta)
 
 
-def resolve_tenant_cpf_cnpj() -> Optional[str]:
+# Tenant padrão (sem EDGE_TENANT_CPF_CNPJ): muda raramente, então fica em cache no processo
+_tenant_cache = TTLCache(ttl=TENANT_CACHE_TTL, maxsize=1)
+# Nome do tenant impresso no recibo do totem ("" = sem nome); só seed/migrations alteram
+_tenant_name_cache = TTLCache(ttl=300, maxsize=512)
+_MISSING = object()
+
+
+def _invalidate_tenant() -> None:
+    """Descarta o tenant padrão (e nomes de tenant) em cache. Chamar após criar/remover/ativar tenants."""
+    _tenant_cache.clear()
+    _tenant_name_cache.clear()
+
+
+def cached_tenant_cpf_cnpj() -> Any:
+    """Tenant padrão sem acessar o banco; `_MISSING` se ainda não resolvido (seguro no event loop)."""
     if EDGE_TENANT_CPF_CNPJ:
         return EDGE_TENANT_CPF_CNPJ
+    return _tenant_cache.get("default", _MISSING)
+
+
+def resolve_tenant_cpf_cnpj() -> Optional[str]:
+    tenant = cached_tenant_cpf_cnpj()
+    if tenant is not _MISSING:
+        return tenant
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute("SELECT cpf_cnpj FROM tenants WHERE situacao = 'ativo' ORDER BY created_at ASC LIMIT 1")
         row = cur.fetchone()
-        return row["cpf_cnpj"] if row else None
+    tenant = row["cpf_cnpj"] if row else None
+    _tenant_cache.set("default", tenant)
+    return tenant
 
 
-def fetch_state() -> Dict[str, Any]:
-    tenant_cpf_cnpj = resolve_tenant_cpf_cnpj()
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT cpf_cnpj, nome_razao_social, nome_fantasia, situacao, logo_base64, tv_theme, tv_audio_enabled, tv_call_sound, tv_video_muted, tv_video_paused, admin_playlist_filter,
-                   tts_enabled, tts_voice, tts_speed, tts_volume
-            FROM tenants
-            WHERE cpf_cnpj = %s
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        tenant = cur.fetchone()
+# Consultas do /tv/state, enviadas ao MySQL em um único lote (uma ida e volta).
+# Todas recebem o tenant como único parâmetro; a ordem define a ordem dos result sets.
+_STATE_SQL: Tuple[str, ...] = (
+    # tenant
+    """
+    SELECT cpf_cnpj, nome_razao_social, nome_fantasia, situacao, logo_base64, tv_theme, tv_audio_enabled, tv_call_sound, tv_video_muted, tv_video_paused, admin_playlist_filter,
+           tts_enabled, tts_voice, tts_speed, tts_volume
+    FROM tenants
+    WHERE cpf_cnpj = %s
+    """,
+    # Todas as chamadas em atendimento (status 'called') do tenant; as 10 primeiras também
+    # servem de histórico legado (fallback quando não há histórico de tickets)
+    """
+    SELECT * FROM calls
+    WHERE tenant_cpf_cnpj = %s AND status IN ('called')
+    ORDER BY called_at DESC
+    """,
+    # Tickets (novo fluxo): chamados/em atendimento
+    """
+    SELECT id, ticket_code, service_name, priority, status, counter_name, operator_name,
+           called_at, service_started_at, completed_at
+    FROM tickets
+    WHERE tenant_cpf_cnpj = %s AND status IN ('called', 'in_service')
+    ORDER BY COALESCE(service_started_at, called_at) DESC
+    """,
+    # Tickets: histórico finalizado
+    """
+    SELECT id, ticket_code, service_name, priority, status, counter_name, operator_name,
+           called_at, service_started_at, completed_at
+    FROM tickets
+    WHERE tenant_cpf_cnpj = %s AND status IN ('completed', 'no_show', 'cancelled')
+    ORDER BY completed_at DESC
+    LIMIT 10
+    """,
+    # Fila de espera: tickets aguardando (para a TV mostrar quem está esperando)
+    """
+    SELECT id, ticket_code, service_name, priority, issued_at
+    FROM tickets
+    WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
+    ORDER BY issued_at ASC
+    LIMIT 20
+    """,
+    # Tenant ticker messages
+    """
+    SELECT id, message, position
+    FROM tenant_announcements
+    WHERE enabled = 1 AND tenant_cpf_cnpj = %s
+    ORDER BY position ASC
+    """,
+    # Playlist
+    """
+    SELECT id, tenant_cpf_cnpj, media_type, url, title, description, author_name, thumbnail_url, duration_seconds,
+           youtube_id, metadata_fetched_at, image_url, slide_duration_seconds,
+           position, enabled, created_at
+    FROM youtube_urls
+    WHERE enabled = 1 AND tenant_cpf_cnpj = %s
+    ORDER BY position ASC, created_at ASC
+    """,
+)
+_STATE_BATCH = ";".join(_STATE_SQL)
 
-        # Buscar todas as chamadas em atendimento (status 'called') do tenant
-        cur.execute(
-            """
-            SELECT * FROM calls
-            WHERE tenant_cpf_cnpj = %s AND status IN ('called')
-            ORDER BY called_at DESC
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        legacy_current_calls = cur.fetchall()
 
-        # Para compatibilidade, current_call é a mais recente
-        current_call = legacy_current_calls[0] if legacy_current_calls else None
+def fetch_result_sets(
+    cur, statements: Union[str, Tuple[str, ...]], params: Union[Tuple[Any, ...], Dict[str, Any]]
+) -> List[List[Any]]:
+    """Executa várias consultas em um só execute() (multi-statement) e retorna um result set por consulta.
 
-        # Histórico: últimas 10 chamadas (para o painel lateral)
-        cur.execute(
-            """
-            SELECT * FROM calls
-            WHERE tenant_cpf_cnpj = %s AND status IN ('called')
-            ORDER BY called_at DESC
-            LIMIT 10
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        legacy_history = cur.fetchall()
+    `statements` pode vir já unido por ';' (consultas fixas, montadas uma vez no import).
+    """
+    cur.execute(statements if isinstance(statements, str) else ";".join(statements), params)
+    results = [cur.fetchall()]
+    while cur.nextset():
+        results.append(cur.fetchall())
+    return results
 
-        # Tickets (novo fluxo): refletir chamados/em atendimento e histórico finalizado no /tv/state
-        cur.execute(
-            """
-            SELECT id, ticket_code, service_name, priority, status, counter_name, operator_name,
-                   called_at, service_started_at, completed_at
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status IN ('called', 'in_service')
-            ORDER BY COALESCE(service_started_at, called_at) DESC
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        tickets_current = cur.fetchall()
 
-        cur.execute(
-            """
-            SELECT id, ticket_code, service_name, priority, status, counter_name, operator_name,
-                   called_at, service_started_at, completed_at
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status IN ('completed', 'no_show', 'cancelled')
-            ORDER BY completed_at DESC
-            LIMIT 10
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        tickets_history = cur.fetchall()
+def fetch_state(tenant_cpf_cnpj: Optional[str]) -> Dict[str, Any]:
+    with db_conn() as conn:
+        # Cursor de tuplas: as colunas de _STATE_SQL são fixas e desempacotadas por posição
+        # (sem um dict intermediário por linha). Só os SELECT * legados usam os nomes das colunas.
+        cur = conn.cursor()
+        cur.execute(_STATE_BATCH, (tenant_cpf_cnpj or "",) * len(_STATE_SQL))
+        results = []
+        while True:
+            results.append((cur.column_names, cur.fetchall()))
+            if not cur.nextset():
+                break
+    (
+        (tenant_cols, tenant_rows),
+        (call_cols, legacy_current_calls),
+        (_, tickets_current),
+        (_, tickets_history),
+        (_, waiting_rows),
+        (_, announcement_rows),
+        (_, urls),
+    ) = results
+    tenant = dict(zip(tenant_cols, tenant_rows[0])) if tenant_rows else None
+
+    waiting_queue = [
+        {"id": id_, "ticket_code": ticket_code, "service_name": service_name, "priority": priority, "issued_at": issued_at}
+        for id_, ticket_code, service_name, priority, issued_at in waiting_rows
+    ]
 
-        # Fila de espera: tickets aguardando (para a TV mostrar quem está esperando)
-        cur.execute(
-            """
-            SELECT id, ticket_code, service_name, priority, issued_at
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
-            ORDER BY issued_at ASC
-            LIMIT 20
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        waiting_rows = cur.fetchall()
-        waiting_queue = [
-            {
-                "id": r.get("id"),
-                "ticket_code": r.get("ticket_code"),
-                "service_name": r.get("service_name"),
-                "priority": r.get("priority"),
-                "issued_at": r.get("issued_at").isoformat() if r.get("issued_at") else None,
-            }
-            for r in waiting_rows
-        ]
+    announcements = [{"id": id_, "message": message, "position": position} for id_, message, position in announcement_rows]
 
-        # Tenant ticker messages
-        cur.execute(
-            """
-            SELECT id, message, position
-            FROM tenant_announcements
-            WHERE enabled = 1 AND tenant_cpf_cnpj = %s
-            ORDER BY position ASC
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        announcements = cur.fetchall()
+    playlist = []
+    for (
+        id_, _tenant, media_type, url, title, description, author_name, thumbnail_url, duration_seconds,
+        youtube_id, metadata_fetched_at, image_url, slide_duration_seconds, position, _enabled, created_at,
+    ) in urls:
+        media_type = (media_type or "youtube").strip().lower()
 
-        cur.execute(
-            """
-            SELECT id, tenant_cpf_cnpj, media_type, url, title, description, author_name, thumbnail_url, duration_seconds,
-                   youtube_id, metadata_fetched_at, image_url, slide_duration_seconds,
-                   position, enabled, created_at
-            FROM youtube_urls
-            WHERE enabled = 1 AND tenant_cpf_cnpj = %s
-            ORDER BY position ASC, created_at ASC
-            """,
-            (tenant_cpf_cnpj or "",),
-        )
-        urls = cur.fetchall()
-        playlist = []
-        for r in urls:
-            media_type = (r.get("media_type") or "youtube").strip().lower()
-            
-            if media_type == "youtube":
-                yid = (r.get("youtube_id") or "").strip() or extract_youtube_id(r.get("url") or "")
-                if not yid:
-                    continue
-                playlist.append(
-                    {
-                        "id": r["id"],
-                        "media_type": "youtube",
-                        "youtube_id": yid,
-                        "url": r.get("url"),
-                        "title": r.get("title") or "",
-                        "description": r.get("description") or "",
-                        "author_name": r.get("author_name") or "",
-                        "thumbnail_url": r.get("thumbnail_url") or "",
-                        "duration_seconds": r.get("duration_seconds"),
-                        "metadata_fetched_at": r.get("metadata_fetched_at").isoformat() if r.get("metadata_fetched_at") else None,
-                        "position": r.get("position"),
-                        "enabled": 1,
-                        "created_at": r.get("created_at").isoformat() if r.get("created_at") else None,
-                    }
-                )
-            else:  # slide
-                image_url = (r.get("image_url") or "").strip()
-                if not image_url:
-                    continue
-                playlist.append(
-                    {
-                        "id": r["id"],
-                        "media_type": "slide",
-                        "image_url": image_url,
-                        "title": r.get("title") or "Slide",
-                        "description": r.get("description") or "",
-                        "slide_duration_seconds": r.get("slide_duration_seconds") or 10,
-                        "position": r.get("position"),
-                        "enabled": 1,
-                        "created_at": r.get("created_at").isoformat() if r.get("created_at") else None,
-                    }
-                )
+        if media_type == "youtube":
+            yid = (youtube_id or "").strip() or extract_youtube_id(url or "")
+            if not yid:
+                continue
+            playlist.append(
+                {
+                    "id": id_,
+                    "media_type": "youtube",
+                    "youtube_id": yid,
+                    "url": url,
+                    "title": title or "",
+                    "description": description or "",
+                    "author_name": author_name or "",
+                    "thumbnail_url": thumbnail_url or "",
+                    "duration_seconds": duration_seconds,
+                    "metadata_fetched_at": metadata_fetched_at,
+                    "position": position,
+                    "enabled": 1,
+                    "created_at": created_at,
+                }
+            )
+        else:  # slide
+            image_url = (image_url or "").strip()
+            if not image_url:
+                continue
+            playlist.append(
+                {
+                    "id": id_,
+                    "media_type": "slide",
+                    "image_url": image_url,
+                    "title": title or "Slide",
+                    "description": description or "",
+                    "slide_duration_seconds": slide_duration_seconds or 10,
+                    "position": position,
+                    "enabled": 1,
+                    "created_at": created_at,
+                }
+            )
 
-    def normalize_call(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        if not row:
-            return None
+    def normalize_call(values: Tuple[Any, ...]) -> Dict[str, Any]:
+        row = dict(zip(call_cols, values))
         return {
             "id": row["id"],
             "ticket_code": row["ticket_code"],
@@ -574,66 +831,122 @@ def fetch_state() -> Dict[str, Any]:
             "priority": row["priority"],
             "counter_name": row["counter_name"],
             "status": row["status"],
-            "called_at": row["called_at"].isoformat() if row.get("called_at") else None,
+            "called_at": row["called_at"],
         }
 
-    def normalize_ticket_to_call(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        if not row:
-            return None
+    def normalize_ticket_to_call(values: Tuple[Any, ...]) -> Dict[str, Any]:
+        (
+            id_, ticket_code, service_name, priority, status, counter_name, operator_name,
+            called_at, service_started_at, completed_at,
+        ) = values
         return {
-            "id": row.get("id"),
-            "ticket_code": row.get("ticket_code"),
-            "service_name": row.get("service_name"),
-            "priority": row.get("priority"),
-            "counter_name": row.get("counter_name") or "",
-            "status": row.get("status"),
-            "operator_name": row.get("operator_name"),
-            "called_at": row.get("called_at").isoformat() if row.get("called_at") else None,
-            "service_started_at": row.get("service_started_at").isoformat() if row.get("service_started_at") else None,
-            "completed_at": row.get("completed_at").isoformat() if row.get("completed_at") else None,
+            "id": id_,
+            "ticket_code": ticket_code,
+            "service_name": service_name,
+            "priority": priority,
+            "counter_name": counter_name or "",
+            "status": status,
+            "operator_name": operator_name,
+            "called_at": called_at,
+            "service_started_at": service_started_at,
+            "completed_at": completed_at,
         }
 
-    merged_current_calls: List[Dict[str, Any]] = []
-    merged_current_calls.extend([c for c in (normalize_ticket_to_call(r) for r in tickets_current) if c])
-    merged_current_calls.extend([c for c in (normalize_call(r) for r in legacy_current_calls) if c])
+    # Para compatibilidade, current_call é a mais recente
+    current_call = normalize_call(legacy_current_calls[0]) if legacy_current_calls else None
 
-    def sort_key(x: Dict[str, Any]) -> str:
-        return str(x.get("called_at") or "")
+    merged_current_calls: List[Dict[str, Any]] = [normalize_ticket_to_call(r) for r in tickets_current]
+    merged_current_calls.extend(normalize_call(r) for r in legacy_current_calls)
+
+    def sort_key(x: Dict[str, Any]) -> datetime:
+        # Datas seguem como datetime até a serialização (orjson): compara direto, sem converter
+        return x["called_at"] or datetime.min
 
     merged_current_calls.sort(key=sort_key, reverse=True)
 
     # Prefer to show real ticket history (completed/no_show/cancelled).
     # Legacy calls are only a fallback when there is no ticket history at all.
-    merged_history: List[Dict[str, Any]] = [c for c in (normalize_ticket_to_call(r) for r in tickets_history) if c]
+    merged_history: List[Dict[str, Any]] = [normalize_ticket_to_call(r) for r in tickets_history]
     if merged_history:
         merged_history.sort(key=sort_key, reverse=True)
         merged_history = merged_history[:10]
     else:
-        merged_history = [c for c in (normalize_call(r) for r in legacy_history) if c][:10]
-
-    # Garantir que campos Decimal do tenant sejam float (JSON serializable)
-    if tenant:
-        for _f in ("tts_speed", "tts_volume"):
-            if _f in tenant and tenant[_f] is not None:
-                tenant[_f] = float(tenant[_f])
+        merged_history = [normalize_call(r) for r in legacy_current_calls[:10]]
 
     return {
         "tenant_cpf_cnpj": tenant_cpf_cnpj,
         "tenant": tenant,
-        "current_call": normalize_call(current_call),
+        "current_call": current_call,
         "current_calls": merged_current_calls,
         "history": merged_history,
         "waiting_queue": waiting_queue,
         "announcements": announcements,
         "playlist": playlist,
-        "server_time": utc_now().isoformat(),
+        "server_time": utc_now(),
     }
 
 
+_tv_state_cache = TTLCache(ttl=TV_STATE_CACHE_TTL, maxsize=64)
+_tv_state_fill_lock = threading.Lock()
+_tv_state_gen_lock = threading.Lock()
+_tv_state_gen = 0
+
+
+def invalidate_tv_state() -> None:
+    """Descarta o /tv/state em cache. Chamar após escritas que a TV exibe (chamadas, fila, playlist, avisos, tenant)."""
+    global _tv_state_gen
+    with _tv_state_gen_lock:
+        _tv_state_gen += 1
+    _tv_state_cache.clear()
+
+
+def _build_tv_state_body(tenant_cpf_cnpj: Optional[str]) -> Tuple[bytes, str]:
+    """Monta o JSON do /tv/state e seu ETag (bloqueante: roda no threadpool)."""
+    key = tenant_cpf_cnpj or ""
+    with _tv_state_fill_lock:
+        # Quem esperou o lock reaproveita o estado recém-montado (uma consulta por janela de TTL)
+        cached = _tv_state_cache.get(key)
+        if cached is None:
+            gen = _tv_state_gen
+            state = fetch_state(tenant_cpf_cnpj)
+            # ETag pelo conteúdo, sem server_time (muda a cada montagem): estado igual => mesmo ETag,
+            # inclusive entre reinícios. server_time é o último campo e é anexado ao JSON já pronto.
+            server_time = state.pop("server_time")
+            payload = dump_json(state)
+            etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+            cached = (payload[:-1] + b',"server_time":' + dump_json(server_time) + b"}", etag)
+            # Não guarda se houve escrita durante a montagem (estado possivelmente antigo)
+            if gen == _tv_state_gen:
+                _tv_state_cache.set(key, cached)
+    return cached
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return any(t.strip().removeprefix("W/") in (etag, "*") for t in if_none_match.split(","))
+
+
 @app.get("/tv/state")
-def tv_state(authorization: Optional[str] = Header(default=None)):
+async def tv_state(
+    authorization: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    # async: cache hit é respondido no event loop, sem ocupar thread do pool do Starlette;
+    # só o acesso ao MySQL (driver síncrono) vai para o threadpool.
     require_token(authorization)
-    return JSONResponse(fetch_state())
+    tenant_cpf_cnpj = cached_tenant_cpf_cnpj()
+    if tenant_cpf_cnpj is _MISSING:
+        tenant_cpf_cnpj = await run_in_threadpool(resolve_tenant_cpf_cnpj)
+    cached = _tv_state_cache.get(tenant_cpf_cnpj or "")
+    if cached is None:
+        cached = await run_in_threadpool(_build_tv_state_body, tenant_cpf_cnpj)
+    body, etag = cached
+    # no-cache: o navegador guarda a resposta mas revalida a cada poll (If-None-Match -> 304 sem corpo)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/tenant/me")
@@ -653,135 +966,136 @@ def tenant_me(authorization: Optional[str] = Header(default=None)):
         row = cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Tenant not found")
-        return row
+        return ORJSONResponse(row)
 
 
-@app.get("/tenant/dashboard")
-def tenant_dashboard(authorization: Optional[str] = Header(default=None)):
-    """
-    Mini-dashboard administrativo do tenant.
-    Nota (MVP): a tabela `calls` ainda não está tenant-scoped, então os contadores de chamadas são globais.
-    """
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+# Caches do dashboard admin (por tenant). Transições de senha chamam invalidate_dashboard().
+_dashboard_live_cache = SWRCache(fresh_for=DASHBOARD_LIVE_TTL, stale_for=DASHBOARD_LIVE_TTL * 3)
+_dashboard_kpis_cache = TTLCache(ttl=DASHBOARD_KPIS_TTL, maxsize=256)
 
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
 
-        # Tenant identification
-        cur.execute(
-            """
-            SELECT cpf_cnpj, nome_razao_social, nome_fantasia, situacao
-            FROM tenants
-            WHERE cpf_cnpj = %s
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        tenant = cur.fetchone()
-        if not tenant:
-            raise HTTPException(status_code=404, detail="Tenant not found")
+# Períodos aceitos pelo dashboard → dias para trás a partir de hoje
+_DASHBOARD_PERIOD_DAYS = {"today": 0, "7d": 7, "30d": 30}
 
-        # Counters/services/users are tenant-scoped
-        cur.execute("SELECT COUNT(*) AS n FROM counters WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        counters_total = int((cur.fetchone() or {}).get("n") or 0)
+# Consultas do dashboard sobre tickets_daily_rollup: texto fixo, data inicial do período como parâmetro.
+# "Hoje" vem de utc_today(): as colunas de data/hora dos tickets (e event_date/day derivadas
+# delas) são gravadas em UTC, então o dia é o UTC, não o do host nem o CURDATE() do MySQL.
+_TOP_OPERATORS_SQL = """
+SELECT r.operator_id, MAX(r.operator_name) AS operator_name, SUM(r.completed_count) AS completed_count
+FROM tickets_daily_rollup r
+WHERE r.tenant_cpf_cnpj = %s AND r.operator_id <> ''
+  AND r.day >= %s
+GROUP BY r.operator_id
+ORDER BY completed_count DESC
+LIMIT %s
+"""
 
-        cur.execute("SELECT COUNT(*) AS n FROM services WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        services_total = int((cur.fetchone() or {}).get("n") or 0)
+_KPIS_ROLLUP_SQL = """
+SELECT NULLIF(r.operator_id, '') AS operator_id, MAX(r.operator_name) AS operator_name, r.priority,
+       SUM(r.completed_count) AS n,
+       SUM(r.timed_count) AS n_dur,
+       SUM(r.sum_service_sec) AS sum_dur,
+       MIN(r.min_service_sec) AS min_dur,
+       MAX(r.max_service_sec) AS max_dur
+FROM tickets_daily_rollup r
+WHERE r.tenant_cpf_cnpj = %s AND r.day >= %s
+GROUP BY r.operator_id, r.priority
+"""
 
-        cur.execute(
-            """
-            SELECT COUNT(*) AS n
-            FROM tenant_users
-            WHERE tenant_cpf_cnpj = %s AND role = 'operator' AND active = 1
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        operators_total = int((cur.fetchone() or {}).get("n") or 0)
 
-        # Atendimentos hoje: tickets completed + calls (tenant-scoped)
-        cur.execute(
-            """
-            SELECT COUNT(*) AS n FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed' AND DATE(completed_at) = CURDATE()
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        tickets_today = int((cur.fetchone() or {}).get("n") or 0)
-        cur.execute(
-            """
-            SELECT COUNT(*) AS n FROM calls
-            WHERE tenant_cpf_cnpj = %s AND called_at IS NOT NULL AND DATE(called_at) = CURDATE()
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        calls_today = int((cur.fetchone() or {}).get("n") or 0)
-        tickets_attended_today = max(tickets_today, calls_today)
+def invalidate_dashboard(tenant_cpf_cnpj: str) -> None:
+    """Descarta o monitor ao vivo e os contadores da fila em cache do tenant (KPIs expiram pelo TTL; reset-history os limpa)."""
+    _dashboard_live_cache.invalidate(tenant_cpf_cnpj)
+    _invalidate_waiting_counts(tenant_cpf_cnpj)
 
-        # Em atendimento (últimos 60 min): tickets called/in_service
-        cur.execute(
-            """
-            SELECT COUNT(*) AS n FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status IN ('called', 'in_service')
-              AND (service_started_at IS NOT NULL OR called_at IS NOT NULL)
-              AND TIMESTAMPDIFF(MINUTE, COALESCE(service_started_at, called_at), NOW()) <= 60
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        in_service_last_60m = int((cur.fetchone() or {}).get("n") or 0)
 
+@app.get("/tenant/dashboard")
+def tenant_dashboard(tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    """
+    Mini-dashboard administrativo do tenant.
+    Nota (MVP): a tabela `calls` ainda não está tenant-scoped, então os contadores de chamadas são globais.
+    """
+    # "Hoje" em UTC, como no monitor ao vivo (completed_at/called_at são gravados em UTC)
+    today = utc_today()
+    with db_conn_ro() as conn:
+        cur = conn.cursor(dictionary=True)
+        # Identificação do tenant + todos os contadores em uma única consulta (subconsultas escalares)
         cur.execute(
             """
-            SELECT MAX(completed_at) AS last_at FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND completed_at IS NOT NULL
+            SELECT
+              t.cpf_cnpj, t.nome_razao_social, t.nome_fantasia, t.situacao,
+              -- Counters/services/users are tenant-scoped
+              (SELECT COUNT(*) FROM counters WHERE tenant_cpf_cnpj = t.cpf_cnpj) AS counters_total,
+              (SELECT COUNT(*) FROM services WHERE tenant_cpf_cnpj = t.cpf_cnpj) AS services_total,
+              (SELECT COUNT(*) FROM tenant_users
+                WHERE tenant_cpf_cnpj = t.cpf_cnpj AND role = 'operator' AND active = 1) AS operators_total,
+              -- Atendimentos hoje: tickets completed + calls (tenant-scoped)
+              (SELECT COUNT(*) FROM tickets
+                WHERE tenant_cpf_cnpj = t.cpf_cnpj AND status = 'completed'
+                  AND completed_at >= %(today)s AND completed_at < %(tomorrow)s) AS tickets_today,
+              (SELECT COUNT(*) FROM calls
+                WHERE tenant_cpf_cnpj = t.cpf_cnpj AND called_at IS NOT NULL
+                  AND called_at >= %(today)s AND called_at < %(tomorrow)s) AS calls_today,
+              -- Em atendimento (últimos 60 min): tickets called/in_service
+              (SELECT COUNT(*) FROM tickets
+                WHERE tenant_cpf_cnpj = t.cpf_cnpj AND status IN ('called', 'in_service')
+                  AND (service_started_at IS NOT NULL OR called_at IS NOT NULL)
+                  AND TIMESTAMPDIFF(MINUTE, COALESCE(service_started_at, called_at), NOW()) <= 60) AS in_service_last_60m,
+              COALESCE(
+                (SELECT MAX(completed_at) FROM tickets WHERE tenant_cpf_cnpj = t.cpf_cnpj AND completed_at IS NOT NULL),
+                (SELECT MAX(called_at) FROM calls WHERE tenant_cpf_cnpj = t.cpf_cnpj AND called_at IS NOT NULL)
+              ) AS last_called_at
+            FROM tenants t
+            WHERE t.cpf_cnpj = %(tenant)s
             """,
-            (tenant_cpf_cnpj,),
+            {"tenant": tenant_cpf_cnpj, "today": today, "tomorrow": today + timedelta(days=1)},
         )
-        last_called_at = (cur.fetchone() or {}).get("last_at")
-        if not last_called_at:
-            cur.execute(
-                "SELECT MAX(called_at) AS last_at FROM calls WHERE tenant_cpf_cnpj = %s AND called_at IS NOT NULL",
-                (tenant_cpf_cnpj,),
-            )
-            last_called_at = (cur.fetchone() or {}).get("last_at")
+        row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Tenant not found")
 
-    return {
+    tenant = {k: row[k] for k in ("cpf_cnpj", "nome_razao_social", "nome_fantasia", "situacao")}
+    counters_total = int(row["counters_total"] or 0)
+    services_total = int(row["services_total"] or 0)
+    operators_total = int(row["operators_total"] or 0)
+    in_service_last_60m = int(row["in_service_last_60m"] or 0)
+    tickets_attended_today = max(int(row["tickets_today"] or 0), int(row["calls_today"] or 0))
+    last_called_at = row["last_called_at"]
+
+    return ORJSONResponse({
         "tenant": tenant,
         "counters_total": counters_total,
         "services_total": services_total,
         "operators_total": operators_total,
         "in_service_last_60m": in_service_last_60m,
         "tickets_attended_today": tickets_attended_today,
-        "last_called_at": last_called_at.isoformat() if last_called_at else None,
-        "server_time": utc_now().isoformat(),
-    }
+        "last_called_at": last_called_at,
+        "server_time": utc_now(),
+    })
 
 
 @app.get("/tenant/dashboard/analytics")
 def dashboard_analytics(
     period: str = Query(default="7d", description="7d ou 30d"),
-    authorization: Optional[str] = Header(default=None),
+    tenant_cpf_cnpj: str = Depends(admin_tenant),
 ):
     """Atendimentos por dia no período (para gráfico). Baseado em tickets completed."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
     days = 7 if period == "7d" else 30
+    today = utc_today()
 
-    with db_conn() as conn:
+    with db_conn_ro() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute(
             """
-            SELECT DATE(completed_at) AS dt, COUNT(*) AS n
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed' AND completed_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            GROUP BY DATE(completed_at)
+            SELECT day AS dt, SUM(completed_count) AS n
+            FROM tickets_daily_rollup
+            WHERE tenant_cpf_cnpj = %s AND day >= %s
+            GROUP BY day
             ORDER BY dt ASC
             """,
-            (tenant_cpf_cnpj, days),
+            (tenant_cpf_cnpj, today - timedelta(days=days)),
         )
         rows = cur.fetchall()
-    from datetime import date, timedelta
     result = {}
     for r in rows:
         dt = r.get("dt")
@@ -789,49 +1103,62 @@ def dashboard_analytics(
         result[key] = int(r.get("n") or 0)
     labels = []
     values = []
-    today = date.today()
     for i in range(days, -1, -1):
         d = today - timedelta(days=i)
         key = d.isoformat()
         labels.append(d.strftime("%d/%m"))
         values.append(result.get(key, 0))
-    return {"labels": labels, "values": values, "period": period}
+    return ORJSONResponse({"labels": labels, "values": values, "period": period})
 
 
 @app.get("/tenant/dashboard/top-operators")
 def dashboard_top_operators(
     period: str = Query(default="7d", description="today, 7d, 30d"),
     limit: int = Query(default=10, ge=1, le=50),
-    authorization: Optional[str] = Header(default=None),
+    tenant_cpf_cnpj: str = Depends(admin_tenant),
 ):
     """Ranking de atendentes por quantidade de atendimentos concluídos."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    if period == "today":
-        date_filter = "AND DATE(t.completed_at) = CURDATE()"
-    elif period == "30d":
-        date_filter = "AND t.completed_at >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)"
-    else:
-        date_filter = "AND t.completed_at >= DATE_SUB(CURDATE(), INTERVAL 7 DAY)"
+    days = _DASHBOARD_PERIOD_DAYS.get(period, 7)
 
-    with db_conn() as conn:
+    with db_conn_ro() as conn:
         cur = conn.cursor(dictionary=True)
-        cur.execute(
-            f"""
-            SELECT t.operator_id, t.operator_name, COUNT(*) AS completed_count
-            FROM tickets t
-            WHERE t.tenant_cpf_cnpj = %s AND t.status = 'completed' AND t.operator_id IS NOT NULL
-            {date_filter}
-            GROUP BY t.operator_id, t.operator_name
-            ORDER BY completed_count DESC
-            LIMIT %s
-            """,
-            (tenant_cpf_cnpj, limit),
-        )
+        cur.execute(_TOP_OPERATORS_SQL, (tenant_cpf_cnpj, utc_today() - timedelta(days=days), limit))
         rows = cur.fetchall()
-    return [{"operator_id": r["operator_id"], "operator_name": r["operator_name"] or "—", "completed_count": int(r["completed_count"] or 0)} for r in rows]
+    for r in rows:
+        r["operator_name"] = r["operator_name"] or "—"
+    return ORJSONResponse(rows)
+
+
+# Texto fixo para qualquer combinação de filtros: filtro ausente vai como NULL e o predicado
+# correspondente vira verdadeiro. Datas como intervalo sobre completed_at (usa o índice).
+# Paginação por keyset (completed_at, id): a página seguinte começa logo após o último item
+# da anterior, com varredura de intervalo em idx_tickets_tenant_completed (tenant_cpf_cnpj, status,
+# completed_at, da migration 007) em vez de reordenar tudo.
+_HISTORY_SQL = """
+SELECT t.id, t.ticket_code, t.service_name, t.priority, t.operator_name, t.counter_name,
+       t.called_at, t.service_started_at, t.completed_at
+FROM tickets t
+WHERE t.tenant_cpf_cnpj = %s AND t.status = 'completed'
+  AND (%s IS NULL OR t.completed_at >= %s)
+  AND (%s IS NULL OR t.completed_at < DATE_ADD(%s, INTERVAL 1 DAY))
+  AND (%s IS NULL OR t.operator_id = %s)
+  AND (%s IS NULL OR t.completed_at < %s OR (t.completed_at = %s AND t.id < %s))
+ORDER BY t.completed_at DESC, t.id DESC
+LIMIT %s
+"""
+
+
+def encode_history_cursor(completed_at: datetime, ticket_id: str) -> str:
+    """Cursor do histórico: base64 (url-safe) de "completed_at|id" do último item da página."""
+    return base64.urlsafe_b64encode(f"{completed_at.isoformat()}|{ticket_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        completed_at, ticket_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(completed_at), ticket_id
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/tenant/dashboard/history")
@@ -840,247 +1167,197 @@ def dashboard_history(
     to_date: Optional[str] = Query(default=None, description="YYYY-MM-DD"),
     operator_id: Optional[str] = Query(default=None),
     limit: int = Query(default=50, ge=1, le=200),
-    authorization: Optional[str] = Header(default=None),
+    cursor: Optional[str] = Query(default=None, description="Página seguinte: valor do header X-Next-Cursor da resposta anterior"),
+    tenant_cpf_cnpj: str = Depends(admin_tenant),
 ):
-    """Histórico de atendimentos com filtros (para modal)."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+    """Histórico de atendimentos com filtros (para modal).
 
-    conditions = ["t.tenant_cpf_cnpj = %s", "t.status = 'completed'"]
-    args = [tenant_cpf_cnpj]
-    if from_date:
-        conditions.append("DATE(t.completed_at) >= %s")
-        args.append(from_date)
-    if to_date:
-        conditions.append("DATE(t.completed_at) <= %s")
-        args.append(to_date)
-    if operator_id:
-        conditions.append("t.operator_id = %s")
-        args.append(operator_id)
-    args.append(limit)
-    where = " AND ".join(conditions)
+    Lista ordenada por completed_at/id decrescentes. Página cheia traz o header X-Next-Cursor;
+    para a próxima página, repita a consulta com `cursor` = esse valor.
+    """
+    # Filtro vazio (?from_date=) conta como ausente
+    from_date, to_date, operator_id = from_date or None, to_date or None, operator_id or None
+    after_at, after_id = decode_history_cursor(cursor) if cursor else (None, None)
 
-    with db_conn() as conn:
+    # Página pequena (limit <= 200): lida inteira antes de devolver a conexão ao pool
+    with db_conn_ro() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute(
-            f"""
-            SELECT t.id, t.ticket_code, t.service_name, t.priority, t.operator_name, t.counter_name,
-                   t.called_at, t.service_started_at, t.completed_at
-            FROM tickets t
-            WHERE {where}
-            ORDER BY t.completed_at DESC
-            LIMIT %s
-            """,
-            args,
+            _HISTORY_SQL,
+            (
+                tenant_cpf_cnpj,
+                from_date, from_date,
+                to_date, to_date,
+                operator_id, operator_id,
+                after_at, after_at, after_at, after_id,
+                limit,
+            ),
         )
         rows = cur.fetchall()
-    def row_to_dict(r):
-        return {
-            "id": r.get("id"),
-            "ticket_code": r.get("ticket_code"),
-            "service_name": r.get("service_name"),
-            "priority": r.get("priority"),
-            "operator_name": r.get("operator_name"),
-            "counter_name": r.get("counter_name"),
-            "called_at": r["called_at"].isoformat() if r.get("called_at") else None,
-            "service_started_at": r["service_started_at"].isoformat() if r.get("service_started_at") else None,
-            "completed_at": r["completed_at"].isoformat() if r.get("completed_at") else None,
-        }
-    return [row_to_dict(r) for r in rows]
+    headers = None
+    if len(rows) == limit:
+        last = rows[-1]
+        headers = {"X-Next-Cursor": encode_history_cursor(last["completed_at"], last["id"])}
+    return ORJSONResponse(rows, headers=headers)
 
 
 @app.get("/tenant/dashboard/kpis")
 def dashboard_kpis(
     period: str = Query(default="30d", description="7d ou 30d"),
-    authorization: Optional[str] = Header(default=None),
+    min_samples: int = Query(default=5, ge=1, description="Mínimo de atendimentos cronometrados para o operador mais rápido"),
+    tenant_cpf_cnpj: str = Depends(admin_tenant),
 ):
     """KPIs para cards do dashboard: preferenciais x normais, maior/menor tempo, operador destaque, menor tempo médio."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
     days = 7 if period == "7d" else 30
-    date_filter = "AND completed_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)"
-
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        # Preferenciais x Normais
-        cur.execute(
-            """
-            SELECT priority, COUNT(*) AS n
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed'
-            """ + date_filter + """
-            GROUP BY priority
-            """,
-            (tenant_cpf_cnpj, days),
-        )
-        by_priority = {r["priority"]: int(r["n"] or 0) for r in cur.fetchall()}
-        preferential_count = by_priority.get("preferential", 0)
-        normal_count = by_priority.get("normal", 0)
+    # A data entra na chave: na virada do dia a entrada anterior simplesmente deixa de ser lida
+    today = utc_today()
+    key = (tenant_cpf_cnpj, days, today)
+    cached = _dashboard_kpis_cache.get(key)
+    if cached is None:
+        cached = _compute_dashboard_kpis(tenant_cpf_cnpj, today - timedelta(days=days))
+        _dashboard_kpis_cache.set(key, cached)
+    kpis, operator_averages = cached
+
+    # Operador com menor tempo médio de atendimento, entre quem tem pelo menos min_samples
+    # atendimentos com duração (evita que um único atendimento rápido lidere o ranking)
+    eligible = [(name, avg) for name, n_dur, avg in operator_averages if n_dur >= min_samples]
+    fastest = min(eligible, key=lambda item: item[1], default=None)
+    return ORJSONResponse({
+        "period": period,
+        **kpis,
+        "fastest_operator_name": (fastest[0] or "—") if fastest else "—",
+        "fastest_operator_avg_seconds": int(fastest[1]) if fastest else 0,
+    })
+
+
+_EMPTY_KPIS: Dict[str, Any] = {
+    "preferential_count": 0,
+    "normal_count": 0,
+    "max_duration_seconds": 0,
+    "min_duration_seconds": 0,
+    "top_operator_name": "—",
+    "top_operator_count": 0,
+}
 
-        # Maior e menor tempo de atendimento (segundos entre service_started_at e completed_at)
-        cur.execute(
-            """
-            SELECT
-              MAX(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)) AS max_sec,
-              MIN(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)) AS min_sec
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed'
-              AND service_started_at IS NOT NULL AND completed_at IS NOT NULL
-            """ + date_filter,
-            (tenant_cpf_cnpj, days),
-        )
-        row = cur.fetchone() or {}
-        max_duration_seconds = int(row.get("max_sec") or 0)
-        min_duration_seconds = int(row.get("min_sec") or 0)
 
-        # Operador com mais atendimentos (destaque / maior quantidade)
-        cur.execute(
-            """
-            SELECT operator_id, operator_name, COUNT(*) AS completed_count
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed' AND operator_id IS NOT NULL
-            """ + date_filter + """
-            GROUP BY operator_id, operator_name
-            ORDER BY completed_count DESC
-            LIMIT 1
-            """,
-            (tenant_cpf_cnpj, days),
-        )
-        top_row = cur.fetchone()
-        top_operator_name = (top_row.get("operator_name") or "—") if top_row else "—"
-        top_operator_count = int((top_row or {}).get("completed_count") or 0)
+def _compute_dashboard_kpis(tenant_cpf_cnpj: str, since: date) -> Tuple[Dict[str, Any], List[Tuple[Optional[str], int, float]]]:
+    """KPIs do período e médias por operador: [(nome, atendimentos com duração, média em segundos)]."""
+    with db_conn_ro() as conn:
+        cur = conn.cursor(dictionary=True)
+        # Agregado diário (tickets_daily_rollup): uma linha por dia x operador x prioridade no
+        # período, em vez de varrer os tickets; os KPIs são derivados em Python (poucas linhas).
+        cur.execute(_KPIS_ROLLUP_SQL, (tenant_cpf_cnpj, since))
+        rows = cur.fetchall()
 
-        # Operador com menor tempo médio de atendimento (só quem tem pelo menos 1 atendimento com duração)
-        cur.execute(
-            """
-            SELECT t.operator_id, t.operator_name,
-                   AVG(TIMESTAMPDIFF(SECOND, t.service_started_at, t.completed_at)) AS avg_sec
-            FROM tickets t
-            WHERE t.tenant_cpf_cnpj = %s AND t.status = 'completed'
-              AND t.service_started_at IS NOT NULL AND t.completed_at IS NOT NULL
-              AND t.operator_id IS NOT NULL
-              AND t.completed_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
-            GROUP BY t.operator_id, t.operator_name
-            HAVING COUNT(*) >= 1
-            ORDER BY avg_sec ASC
-            LIMIT 1
-            """,
-            (tenant_cpf_cnpj, days),
-        )
-        fast_row = cur.fetchone()
-        fastest_operator_name = (fast_row.get("operator_name") or "—") if fast_row else "—"
-        fastest_operator_avg_seconds = int((fast_row or {}).get("avg_sec") or 0)
+    # Sem atendimentos no período (tenant novo/ocioso): todos os KPIs são zero/placeholder
+    if not rows:
+        return dict(_EMPTY_KPIS), []
+
+    # Preferenciais x Normais
+    by_priority: Dict[str, int] = {}
+    # Maior e menor tempo de atendimento (segundos entre service_started_at e completed_at)
+    durations_min: List[int] = []
+    durations_max: List[int] = []
+    # Por operador: (nome, atendimentos, atendimentos com duração, soma das durações)
+    by_operator: Dict[Tuple[str, Optional[str]], List[int]] = {}
+    for r in rows:
+        by_priority[r["priority"]] = by_priority.get(r["priority"], 0) + int(r["n"] or 0)
+        if r["n_dur"]:
+            durations_min.append(int(r["min_dur"]))
+            durations_max.append(int(r["max_dur"]))
+        if r["operator_id"] is not None:
+            agg = by_operator.setdefault((r["operator_id"], r["operator_name"]), [0, 0, 0])
+            agg[0] += int(r["n"] or 0)
+            agg[1] += int(r["n_dur"] or 0)
+            agg[2] += int(r["sum_dur"] or 0)
+
+    preferential_count = by_priority.get("preferential", 0)
+    normal_count = by_priority.get("normal", 0)
+    max_duration_seconds = max(durations_max, default=0)
+    min_duration_seconds = min(durations_min, default=0)
+
+    # Operador com mais atendimentos (destaque / maior quantidade)
+    top = max(by_operator.items(), key=lambda kv: kv[1][0], default=None)
+    top_operator_name = (top[0][1] or "—") if top else "—"
+    top_operator_count = top[1][0] if top else 0
+
+    # Tempo médio por operador (o corte por min_samples é aplicado por requisição)
+    operator_averages = [(key[1], agg[1], agg[2] / agg[1]) for key, agg in by_operator.items() if agg[1]]
 
     return {
-        "period": period,
         "preferential_count": preferential_count,
         "normal_count": normal_count,
         "max_duration_seconds": max_duration_seconds,
         "min_duration_seconds": min_duration_seconds,
         "top_operator_name": top_operator_name,
         "top_operator_count": top_operator_count,
-        "fastest_operator_name": fastest_operator_name,
-        "fastest_operator_avg_seconds": fastest_operator_avg_seconds,
-    }
+    }, operator_averages
 
 
 @app.get("/tenant/dashboard/live")
-def dashboard_live(authorization: Optional[str] = Header(default=None)):
+def dashboard_live(tenant_cpf_cnpj: str = Depends(admin_tenant)):
     """Monitor ao vivo: fila atual, atendimentos de hoje, médias e breakdown por hora."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-
-        # Fila atual (aguardando)
-        cur.execute(
-            """
-            SELECT priority, COUNT(*) AS n
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
-            GROUP BY priority
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        queue_by_priority = {r["priority"]: int(r["n"] or 0) for r in cur.fetchall()}
-
-        # Contagens do dia por status
-        cur.execute(
-            """
-            SELECT status, COUNT(*) AS n
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND DATE(issued_at) = CURDATE()
-            GROUP BY status
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        today_by_status = {r["status"]: int(r["n"] or 0) for r in cur.fetchall()}
-
-        # Tempo médio de espera hoje (issued_at → called_at)
-        cur.execute(
-            """
-            SELECT AVG(TIMESTAMPDIFF(SECOND, issued_at, called_at)) AS avg_wait
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND called_at IS NOT NULL
-              AND DATE(issued_at) = CURDATE()
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        row = cur.fetchone() or {}
-        avg_wait = int(row.get("avg_wait") or 0)
+    # Monitor faz polling contínuo: uma montagem por tenant a cada DASHBOARD_LIVE_TTL segundos
+    return ORJSONResponse(
+        _dashboard_live_cache.get_or_compute(tenant_cpf_cnpj, lambda: _compute_dashboard_live(tenant_cpf_cnpj))
+    )
 
-        # Tempo médio de atendimento hoje (service_started_at → completed_at)
-        cur.execute(
-            """
-            SELECT AVG(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)) AS avg_svc
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s AND status = 'completed'
-              AND service_started_at IS NOT NULL AND completed_at IS NOT NULL
-              AND DATE(issued_at) = CURDATE()
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        row = cur.fetchone() or {}
-        avg_service = int(row.get("avg_svc") or 0)
 
-        # Breakdown por hora (últimas 12h, baseado em completed_at e no_show/called)
-        cur.execute(
-            """
-            SELECT
-              HOUR(COALESCE(completed_at, called_at)) AS hora,
-              SUM(status = 'completed') AS atendidos,
-              SUM(status IN ('no_show', 'cancelled')) AS desistentes
-            FROM tickets
-            WHERE tenant_cpf_cnpj = %s
-              AND DATE(issued_at) = CURDATE()
-              AND (completed_at IS NOT NULL OR called_at IS NOT NULL)
-            GROUP BY hora
-            ORDER BY hora ASC
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        hourly_rows = cur.fetchall()
-
-    pref_queue = queue_by_priority.get("preferential", 0)
-    norm_queue = queue_by_priority.get("normal", 0)
-    attended = today_by_status.get("completed", 0)
-    in_service = today_by_status.get("called", 0) + today_by_status.get("in_service", 0)
-    no_show = today_by_status.get("no_show", 0)
-    cancelled = today_by_status.get("cancelled", 0)
-
-    hourly = [
-        {
-            "hour": f"{int(r['hora']):02d}:00",
-            "attended": int(r["atendidos"] or 0),
-            "desistentes": int(r["desistentes"] or 0),
-        }
-        for r in hourly_rows
-        if r["hora"] is not None
-    ]
+def _compute_dashboard_live(tenant_cpf_cnpj: str) -> Dict[str, Any]:
+    with db_conn_ro() as conn:
+        cur = conn.cursor(dictionary=True)
+        # As duas consultas do monitor vão ao MySQL em um único lote (uma ida e volta)
+        pivot_rows, hourly_rows = fetch_result_sets(
+            cur,
+            (
+                # Fila atual (aguardando) + contagens e médias do dia em uma única varredura (pivot).
+                # Espera: wait_sec (issued_at → called_at); atendimento: service_sec (service_started_at →
+                # completed_at). Colunas geradas da migration 023, NULL enquanto incompletas.
+                """
+                SELECT
+                  SUM(status = 'waiting' AND priority = 'preferential') AS q_pref,
+                  SUM(status = 'waiting' AND priority = 'normal') AS q_norm,
+                  SUM(event_date = %(today)s AND status = 'completed') AS t_completed,
+                  SUM(event_date = %(today)s AND status IN ('called', 'in_service')) AS t_in_service,
+                  SUM(event_date = %(today)s AND status = 'no_show') AS t_no_show,
+                  SUM(event_date = %(today)s AND status = 'cancelled') AS t_cancelled,
+                  AVG(CASE WHEN event_date = %(today)s THEN wait_sec END) AS avg_wait,
+                  AVG(CASE WHEN event_date = %(today)s AND status = 'completed' THEN service_sec END) AS avg_svc
+                FROM tickets
+                WHERE tenant_cpf_cnpj = %(tenant)s AND (status = 'waiting' OR event_date = %(today)s)
+                """,
+                # Breakdown por hora (últimas 12h, baseado em completed_at e no_show/called).
+                # event_date/event_hour são colunas geradas (migration 021): agrupa por hora e status
+                # direto na ordem do índice (tenant, event_date, event_hour, status); o pivot é feito abaixo.
+                """
+                SELECT event_hour AS hora, status, COUNT(*) AS n
+                FROM tickets
+                WHERE tenant_cpf_cnpj = %(tenant)s AND event_date = %(today)s AND event_hour IS NOT NULL
+                  AND status IN ('completed', 'no_show', 'cancelled')
+                GROUP BY event_hour, status
+                ORDER BY event_hour ASC
+                """,
+            ),
+            {"tenant": tenant_cpf_cnpj, "today": utc_today()},
+        )
+    counts = {k: int(v or 0) for k, v in (pivot_rows[0] if pivot_rows else {}).items()}
+    avg_wait = counts.get("avg_wait", 0)
+    avg_service = counts.get("avg_svc", 0)
+
+    pref_queue = counts.get("q_pref", 0)
+    norm_queue = counts.get("q_norm", 0)
+    attended = counts.get("t_completed", 0)
+    in_service = counts.get("t_in_service", 0)
+    no_show = counts.get("t_no_show", 0)
+    cancelled = counts.get("t_cancelled", 0)
+
+    by_hour: Dict[int, Dict[str, Any]] = {}
+    for r in hourly_rows:
+        slot = by_hour.get(r["hora"])
+        if slot is None:
+            slot = by_hour[r["hora"]] = {"hour": f"{int(r['hora']):02d}:00", "attended": 0, "desistentes": 0}
+        slot["attended" if r["status"] == "completed" else "desistentes"] += int(r["n"])
+    hourly = list(by_hour.values())
 
     return {
         "queue": {"preferential": pref_queue, "normal": norm_queue, "total": pref_queue + norm_queue},
@@ -1094,7 +1371,7 @@ def dashboard_live(authorization: Optional[str] = Header(default=None)):
         "avg_wait_seconds": avg_wait,
         "avg_service_seconds": avg_service,
         "hourly": hourly,
-        "server_time": utc_now().isoformat(),
+        "server_time": utc_now(),
     }
 
 
@@ -1102,13 +1379,28 @@ def dashboard_live(authorization: Optional[str] = Header(default=None)):
 # YouTube playlist (tenant-scoped) - CRUD for Admin Tenant
 # ============================================================
 
+# Lista da playlist por tenant, já serializada (bytes JSON). Escritas chamam invalidate_playlist().
+_playlist_cache = TTLCache(ttl=PLAYLIST_CACHE_TTL, maxsize=256)
+
+
+def invalidate_playlist(tenant_cpf_cnpj: Optional[str] = None) -> None:
+    """Descarta a playlist em cache do tenant (ou de todos, sem tenant: seed/reset)."""
+    if tenant_cpf_cnpj is None:
+        _playlist_cache.clear()
+    else:
+        _playlist_cache.pop(tenant_cpf_cnpj)
+
 
 @app.get("/tenant/youtube")
-def tenant_list_youtube(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+def tenant_list_youtube(tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    body = _playlist_cache.get(tenant_cpf_cnpj)
+    if body is None:
+        body = dump_json(_fetch_playlist(tenant_cpf_cnpj))
+        _playlist_cache.set(tenant_cpf_cnpj, body)
+    return Response(content=body, media_type="application/json")
 
+
+def _fetch_playlist(tenant_cpf_cnpj: str) -> List[Dict[str, Any]]:
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute(
@@ -1124,21 +1416,44 @@ def tenant_list_youtube(authorization: Optional[str] = Header(default=None)):
             """,
             (tenant_cpf_cnpj,),
         )
-        rows = cur.fetchall()
-        for r in rows:
-            if r.get("metadata_fetched_at"):
-                r["metadata_fetched_at"] = r["metadata_fetched_at"].isoformat()
-            if r.get("created_at"):
-                r["created_at"] = r["created_at"].isoformat()
-        return rows
+        # Datas seguem como datetime: o dump_json (orjson) já as escreve em ISO-8601
+        return cur.fetchall()
 
 
-@app.post("/tenant/youtube")
-def tenant_create_youtube(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+_B64_CHUNK = 64 * 1024  # múltiplo de 4: cada bloco de base64 decodifica sozinho
+
 
+def save_slide_image(data_url: str) -> str:
+    """Grava em .run/slides/ a imagem de um data URL (data:image/...;base64,...) e retorna o nome do arquivo.
+
+    O base64 é decodificado em blocos de 64 KiB direto para o arquivo, sem montar a imagem
+    inteira decodificada em memória.
+    """
+    comma = data_url.find(",")
+    if comma < 0:
+        raise ValueError("invalid data URL")
+    mime_type = data_url[:comma].split(";")[0].replace("data:", "")
+    ext = mime_type.split("/")[1] if "/" in mime_type else "png"
+
+    slides_dir = os.path.join(os.getcwd(), ".run", "slides")
+    os.makedirs(slides_dir, exist_ok=True)
+    fname = f"{uuid.uuid4()}.{ext}"
+
+    with open(os.path.join(slides_dir, fname), "wb") as f:
+        pending = ""
+        for start in range(comma + 1, len(data_url), _B64_CHUNK):
+            # Espaços/quebras de linha são ignorados, como no decode do data URL inteiro
+            pending += "".join(data_url[start:start + _B64_CHUNK].split())
+            usable = len(pending) - len(pending) % 4
+            f.write(binascii.a2b_base64(pending[:usable]))
+            pending = pending[usable:]
+        if pending:
+            f.write(binascii.a2b_base64(pending))
+    return fname
+
+
+@app.post("/tenant/youtube")
+def tenant_create_youtube(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
     # Get media_type from payload
     media_type_raw = payload_in.get("media_type")
     if media_type_raw:
@@ -1149,8 +1464,8 @@ def tenant_create_youtube(payload_in: Dict[str, Any], authorization: Optional[st
     if media_type not in ("youtube", "slide"):
         media_type = "youtube"
 
-    description = (payload_in.get("description") or "").strip() or None  # comment
-    enabled = 1 if payload_in.get("enabled", True) else 0
+    description = str_field(payload_in, "description") or None  # comment
+    enabled = to_bit(payload_in.get("enabled", True), "enabled")
     position = payload_in.get("position")
     try:
         position_i = int(position) if position is not None else 1
@@ -1169,7 +1484,7 @@ def tenant_create_youtube(payload_in: Dict[str, Any], authorization: Optional[st
     url = None
 
     if media_type == "youtube":
-        url = (payload_in.get("url") or "").strip()
+        url = str_field(payload_in, "url")
         if not url:
             raise HTTPException(status_code=400, detail="url is required for YouTube videos")
         youtube_id = extract_youtube_id(url) or None
@@ -1192,27 +1507,8 @@ def tenant_create_youtube(payload_in: Dict[str, Any], authorization: Optional[st
         try:
             if not image_base64.startswith("data:image/"):
                 raise HTTPException(status_code=400, detail="image_base64 must be a data URL (data:image/...)")
-            # Extrair tipo e dados
-            header, data = image_base64.split(",", 1)
-            mime_type = header.split(";")[0].replace("data:", "")
-            ext = mime_type.split("/")[1] if "/" in mime_type else "png"
-            
-            # Criar diretório para slides
-            base_dir = os.getcwd()
-            slides_dir = os.path.join(base_dir, ".run", "slides")
-            os.makedirs(slides_dir, exist_ok=True)
-            
-            # Salvar arquivo
-            slide_id = str(uuid.uuid4())
-            fname = f"{slide_id}.{ext}"
-            saved_path = os.path.join(slides_dir, fname)
-            
-            import base64
-            with open(saved_path, "wb") as f:
-                f.write(base64.b64decode(data))
-            
-            # URL relativa para servir depois
-            image_url = f"/api/slides/{fname}"
+            # Salvar arquivo; URL relativa para servir depois
+            image_url = f"/api/slides/{save_slide_image(image_base64)}"
             title = payload_in.get("title") or "Slide"
             # Não gerar thumbnail - usar image_url diretamente com CSS resize
             thumbnail_url = None
@@ -1259,27 +1555,13 @@ def tenant_create_youtube(payload_in: Dict[str, Any], authorization: Optional[st
                 enabled,
             ),
         )
+    invalidate_playlist(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "id": vid}
 
 
 @app.put("/tenant/youtube/{video_id}")
-def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    # Verificar o tipo de mídia atual
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            "SELECT media_type FROM youtube_urls WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (video_id, tenant_cpf_cnpj),
-        )
-        existing = cur.fetchone()
-        if not existing:
-            raise HTTPException(status_code=404, detail="Item not found")
-        current_media_type = (existing.get("media_type") or "youtube").strip().lower()
-
+def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
     url = payload_in.get("url")
     description = payload_in.get("description")
     enabled = payload_in.get("enabled")
@@ -1290,19 +1572,26 @@ def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], authorizati
     image_base64 = payload_in.get("image_base64")
     slide_duration = payload_in.get("slide_duration_seconds")
 
+    # Tipo de mídia deduzido dos campos enviados (sem SELECT prévio): o UPDATE só casa com itens
+    # desse tipo, e tipo errado resulta em 404. Só campos comuns: vale para qualquer tipo.
+    youtube_fields = url is not None or "refetch_metadata" in payload_in
+    slide_fields = bool(image_base64) or slide_duration is not None
+    if youtube_fields and slide_fields:
+        raise HTTPException(status_code=400, detail="YouTube and slide fields cannot be combined")
+    expected_media_type = "youtube" if youtube_fields else "slide" if slide_fields else None
+    saved_image: Optional[str] = None
+
     sets: List[str] = []
     args: List[Any] = []
 
-    if current_media_type == "youtube":
+    if expected_media_type == "youtube":
         if url is not None:
             u = str(url).strip()
             if not u:
                 raise HTTPException(status_code=400, detail="url cannot be empty")
-            sets.append("url = %s")
-            args.append(u)
-            if refetch:
-                youtube_id = extract_youtube_id(u) or None
-                meta = fetch_youtube_oembed(u)
+            # URL já conhecida sai do cache do oEmbed (memória/disco), sem ida ao YouTube
+            meta = fetch_youtube_oembed(u) if refetch else {}
+            if meta:
                 title = (meta.get("title") or "").strip() or None
                 author_name = (meta.get("author_name") or "").strip() or None
                 thumbnail_url = (meta.get("thumbnail_url") or "").strip() or None
@@ -1315,30 +1604,30 @@ def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], authorizati
                         "metadata_fetched_at = %s",
                     ]
                 )
-                args.extend([youtube_id, title, author_name, thumbnail_url, utc_now()])
-    else:  # slide
+                args.extend([extract_youtube_id(u) or None, title, author_name, thumbnail_url, utc_now()])
+            elif refetch:
+                # oEmbed sem resposta: com a mesma URL os metadados gravados continuam valendo;
+                # com outra URL são limpos. A comparação usa a URL antiga porque estas
+                # atribuições vêm antes de "url = %s" no UPDATE.
+                sets.extend(
+                    [
+                        "youtube_id = %s",
+                        "title = IF(url <=> %s, title, NULL)",
+                        "author_name = IF(url <=> %s, author_name, NULL)",
+                        "thumbnail_url = IF(url <=> %s, thumbnail_url, NULL)",
+                    ]
+                )
+                args.extend([extract_youtube_id(u) or None, u, u, u])
+            sets.append("url = %s")
+            args.append(u)
+    elif expected_media_type == "slide":
         if image_base64:
             # Salvar nova imagem
             try:
                 if not image_base64.startswith("data:image/"):
                     raise HTTPException(status_code=400, detail="image_base64 must be a data URL (data:image/...)")
-                header, data = image_base64.split(",", 1)
-                mime_type = header.split(";")[0].replace("data:", "")
-                ext = mime_type.split("/")[1] if "/" in mime_type else "png"
-                
-                base_dir = os.getcwd()
-                slides_dir = os.path.join(base_dir, ".run", "slides")
-                os.makedirs(slides_dir, exist_ok=True)
-                
-                slide_id = str(uuid.uuid4())
-                fname = f"{slide_id}.{ext}"
-                saved_path = os.path.join(slides_dir, fname)
-                
-                import base64
-                with open(saved_path, "wb") as f:
-                    f.write(base64.b64decode(data))
-                
-                image_url = f"/api/slides/{fname}"
+                saved_image = save_slide_image(image_base64)
+                image_url = f"/api/slides/{saved_image}"
                 sets.append("image_url = %s")
                 args.append(str(image_url).strip())
                 # Não gerar thumbnail - usar image_url diretamente com CSS resize
@@ -1368,7 +1657,7 @@ def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], authorizati
 
     if enabled is not None:
         sets.append("enabled = %s")
-        args.append(1 if enabled else 0)
+        args.append(to_bit(enabled, "enabled"))
 
     if position is not None:
         try:
@@ -1383,37 +1672,42 @@ def tenant_update_youtube(video_id: str, payload_in: Dict[str, Any], authorizati
     if not sets:
         raise HTTPException(status_code=400, detail="No fields to update")
 
+    where = "id = %s AND tenant_cpf_cnpj = %s"
+    args.extend([video_id, tenant_cpf_cnpj])
+    if expected_media_type:
+        where += " AND media_type = %s"
+        args.append(expected_media_type)
+
     with db_conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            f"UPDATE youtube_urls SET {', '.join(sets)} WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (*args, video_id, tenant_cpf_cnpj),
-        )
+        cur.execute(f"UPDATE youtube_urls SET {', '.join(sets)} WHERE {where}", tuple(args))
         if cur.rowcount == 0:
+            if saved_image:
+                # Item inexistente (ou de outro tipo): descarta a imagem recém-gravada
+                try:
+                    os.remove(os.path.join(os.getcwd(), ".run", "slides", saved_image))
+                except OSError:
+                    pass
             raise HTTPException(status_code=404, detail="Item not found")
+    invalidate_playlist(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True}
 
 
 @app.delete("/tenant/youtube/{video_id}")
-def tenant_delete_youtube(video_id: str, authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
+def tenant_delete_youtube(video_id: str, tenant_cpf_cnpj: str = Depends(admin_tenant)):
     with db_conn() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM youtube_urls WHERE id = %s AND tenant_cpf_cnpj = %s", (video_id, tenant_cpf_cnpj))
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Video not found")
+    invalidate_playlist(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True}
 
 
 @app.post("/tenant/youtube/{video_id}/toggle")
-def tenant_toggle_youtube(video_id: str, payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
+def tenant_toggle_youtube(video_id: str, payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
     enabled = payload_in.get("enabled")
     if enabled is None:
         raise HTTPException(status_code=400, detail="enabled is required")
@@ -1422,19 +1716,17 @@ def tenant_toggle_youtube(video_id: str, payload_in: Dict[str, Any], authorizati
         cur = conn.cursor()
         cur.execute(
             "UPDATE youtube_urls SET enabled = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (1 if enabled else 0, video_id, tenant_cpf_cnpj),
+            (to_bit(enabled, "enabled"), video_id, tenant_cpf_cnpj),
         )
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Video not found")
+    invalidate_playlist(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True}
 
 
 @app.post("/tenant/youtube/reorder")
-def tenant_reorder_youtube(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
+def tenant_reorder_youtube(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
     items = payload_in.get("items")
     if not isinstance(items, list) or not items:
         raise HTTPException(status_code=400, detail="items must be a non-empty list")
@@ -1458,13 +1750,23 @@ def tenant_reorder_youtube(payload_in: Dict[str, Any], authorization: Optional[s
     if not updates:
         raise HTTPException(status_code=400, detail="No valid items")
 
+    # Um único UPDATE com CASE para todos os itens (uma ida ao banco, aplicado de forma atômica).
+    # id repetido: vale a última posição enviada, como no UPDATE item a item.
+    positions = {vid: p for p, vid in updates}
+    cases = " ".join(["WHEN %s THEN %s"] * len(positions))
+    in_ph = ", ".join(["%s"] * len(positions))
+    args: List[Any] = [arg for vid, p in positions.items() for arg in (vid, p)]
+    args.extend(positions)
+    args.append(tenant_cpf_cnpj)
+
     with db_conn() as conn:
         cur = conn.cursor()
-        for p, vid in updates:
-            cur.execute(
-                "UPDATE youtube_urls SET position = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-                (p, vid, tenant_cpf_cnpj),
-            )
+        cur.execute(
+            f"UPDATE youtube_urls SET position = CASE id {cases} END WHERE id IN ({in_ph}) AND tenant_cpf_cnpj = %s",
+            tuple(args),
+        )
+    invalidate_playlist(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "updated": len(updates)}
 
 
@@ -1484,6 +1786,10 @@ def generate_thumbnail(image_path: str, output_path: str, size: Tuple[int, int]
     try:
         # Abrir imagem original
         img = Image.open(image_path)
+        if img.format == 'JPEG':
+            # Reduz já na decodificação (escala 1/2, 1/4, 1/8 do libjpeg), mantendo ao menos o dobro
+            # do tamanho final: o crop central e o LANCZOS trabalham sobre bem menos pixels
+            img.draft('RGB', (size[0] * 2, size[1] * 2))
         # Converter para RGB se necessário (para JPEG)
         if img.mode in ('RGBA', 'LA'):
             # Criar fundo branco para imagens com transparência
@@ -1545,32 +1851,44 @@ def generate_thumbnail(image_path: str, output_path: str, size: Tuple[int, int]
         raise Exception(f"Error generating thumbnail: {str(e)}")
 
 
+# Nomes de arquivo servidos/aceitos (sons, slides): só letras, dígitos, '-', '_' e '.'
+_SAFE_FILENAME_RE = re.compile(r"\A[A-Za-z0-9._-]+\Z")
+
+
 def _sounds_dir() -> str:
     """Directory containing call sound files (project root / sounds)."""
     base = os.getcwd()
     return os.path.join(base, "sounds")
 
 
+# Listagem de sounds/ guardada com o mtime do diretório: só é refeita quando arquivos mudam
+_sounds_listing: Optional[Tuple[int, List[str]]] = None
+
+
 @app.get("/api/sounds")
 def list_sounds():
     """List available sound filenames for call alert (MP3/WAV in sounds/)."""
-    import glob
+    global _sounds_listing
     sounds_dir = _sounds_dir()
-    if not os.path.isdir(sounds_dir):
+    try:
+        mtime = os.stat(sounds_dir).st_mtime_ns
+    except OSError:
         return {"sounds": ["notification-1.mp3"]}
-    names = []
-    for ext in ("*.mp3", "*.wav"):
-        for path in glob.glob(os.path.join(sounds_dir, ext)):
-            names.append(os.path.basename(path))
-    names.sort()
-    return {"sounds": names if names else ["notification-1.mp3"]}
+    cached = _sounds_listing
+    if cached is None or cached[0] != mtime:
+        with os.scandir(sounds_dir) as it:
+            names = sorted(
+                e.name for e in it
+                if e.name.endswith((".mp3", ".wav")) and not e.name.startswith(".") and e.is_file()
+            )
+        cached = _sounds_listing = (mtime, names)
+    return {"sounds": cached[1] or ["notification-1.mp3"]}
 
 
 @app.get("/api/sounds/{filename}")
-def serve_sound(filename: str):
+async def serve_sound(filename: str):
     """Serve a sound file from the sounds/ directory (for TV call alert)."""
-    import mimetypes
-    if not all(c.isalnum() or c in ("-", "_", ".") for c in filename):
+    if not _SAFE_FILENAME_RE.match(filename):
         raise HTTPException(status_code=400, detail="Invalid filename")
     sounds_dir = _sounds_dir()
     file_path = os.path.join(sounds_dir, filename)
@@ -1581,31 +1899,92 @@ def serve_sound(filename: str):
     mime_type, _ = mimetypes.guess_type(file_path)
     if not mime_type:
         mime_type = "audio/mpeg"
-    with open(file_path, "rb") as f:
-        body = f.read()
-    return StreamingResponse(iter([body]), media_type=mime_type)
+    return FileResponse(file_path, media_type=mime_type)
+
+
+_TTS_DIGIT_WORDS = {
+    '0': 'zero', '1': 'um', '2': 'dois', '3': 'três', '4': 'quatro',
+    '5': 'cinco', '6': 'seis', '7': 'sete', '8': 'oito', '9': 'nove',
+}
+_TTS_KOKORO_URL = os.environ.get("KOKORO_TTS_URL", "http://localhost:8880/v1/audio/speech")
+_TTS_VALID_VOICES = frozenset(("pf_dora", "pm_alex", "pm_santa"))
+
+
+def _tts_cache_dir() -> str:
+    return os.path.join(os.getcwd(), ".run", "tts_cache")
+
+
+# Arquivos com nome derivado do conteúdo (hash/uuid): o navegador da TV pode reaproveitar por 1 dia
+_IMMUTABLE_FILE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+# Locks por chave do cache de TTS (distribuídas em 64 faixas, sem crescer com o número de textos)
+_TTS_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+def ensure_tts_file(text: str, voice: str, speed: float, volume: float) -> str:
+    """Caminho do MP3 em cache para o texto/voz; gera via Kokoro se ainda não existir.
+
+    Pedidos simultâneos para o mesmo anúncio (prefetch + TV) esperam a mesma geração em vez de
+    chamar o Kokoro duas vezes. O arquivo é gravado em .tmp e renomeado (nunca lido pela metade).
+    Erros de comunicação com o Kokoro são propagados.
+    """
+    fingerprint = f"{text}|{voice}|{speed:.2f}|{volume:.2f}".encode()
+    cache_key = hashlib.blake2b(fingerprint, digest_size=16).hexdigest()
+    cache_file = os.path.join(_tts_cache_dir(), f"{cache_key}.mp3")
+    if os.path.isfile(cache_file):
+        return cache_file
+    with _TTS_LOCKS[int(cache_key[:8], 16) % len(_TTS_LOCKS)]:
+        if os.path.isfile(cache_file):
+            return cache_file
+        # Cache gravado antes da troca para BLAKE2 (nome = MD5): renomeia em vez de gerar de novo
+        legacy_file = os.path.join(_tts_cache_dir(), f"{hashlib.md5(fingerprint).hexdigest()}.mp3")
+        try:
+            os.replace(legacy_file, cache_file)
+            return cache_file
+        except FileNotFoundError:
+            pass
+        os.makedirs(_tts_cache_dir(), exist_ok=True)
+        payload = json.dumps({
+            "model": "kokoro",
+            "input": text,
+            "voice": voice,
+            "response_format": "mp3",
+            "speed": speed,
+            "volume_multiplier": volume,
+        }).encode()
+        req = Request(_TTS_KOKORO_URL, data=payload, headers={"Content-Type": "application/json"})
+        with urlopen(req, timeout=15) as resp:
+            audio_bytes = resp.read()
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp_file, cache_file)
+    return cache_file
 
 
-_TTS_DIGIT_WORDS = {
-    '0': 'zero', '1': 'um', '2': 'dois', '3': 'três', '4': 'quatro',
-    '5': 'cinco', '6': 'seis', '7': 'sete', '8': 'oito', '9': 'nove',
-}
-_TTS_KOKORO_URL = os.environ.get("KOKORO_TTS_URL", "http://localhost:8880/v1/audio/speech")
-_TTS_VALID_VOICES = {"pf_dora", "pm_alex", "pm_santa"}
+class _CallTextTable(dict):
+    """Tabela do str.translate para a senha falada: dígito → palavra, letra → ela mesma, resto → removido.
 
+    Cada caractere vira um token seguido de espaço; a tabela é preenchida sob demanda.
+    """
+
+    def __missing__(self, code: int) -> Optional[str]:
+        ch = chr(code)
+        if ch in _TTS_DIGIT_WORDS:
+            value: Optional[str] = _TTS_DIGIT_WORDS[ch] + " "
+        elif ch.isalpha():
+            value = ch + " "
+        else:
+            value = None
+        self[code] = value
+        return value
 
-def _tts_cache_dir() -> str:
-    return os.path.join(os.getcwd(), ".run", "tts_cache")
+
+_CALL_TEXT_TABLE = _CallTextTable()
 
 
 def _format_call_text(ticket_code: str, service_name: str, counter_name: str = "") -> str:
-    parts = []
-    for ch in (ticket_code or "").upper():
-        if ch.isdigit():
-            parts.append(_TTS_DIGIT_WORDS[ch])
-        elif ch.isalpha():
-            parts.append(ch)
-    ticket_text = " ".join(parts) if parts else ticket_code
+    ticket_text = (ticket_code or "").upper().translate(_CALL_TEXT_TABLE).rstrip() or ticket_code
     label = service_name.strip() if service_name and service_name.strip() else counter_name.strip()
     return f"Senha {ticket_text}, {label}." if label else f"Senha {ticket_text}."
 
@@ -1626,25 +2005,7 @@ def _prefetch_tts(tenant_cpf_cnpj: str, ticket_code: str, service_name: str, cou
             voice = (row.get("tts_voice") or "pf_dora").strip() or "pf_dora"
             speed = max(0.25, min(4.0, float(row.get("tts_speed") or 0.85)))
             volume = max(0.1, min(4.0, float(row.get("tts_volume") or 1.0)))
-            text = _format_call_text(ticket_code, service_name, counter_name)
-            cache_key = hashlib.md5(f"{text}|{voice}|{speed:.2f}|{volume:.2f}".encode()).hexdigest()
-            cache_file = os.path.join(_tts_cache_dir(), f"{cache_key}.mp3")
-            if os.path.isfile(cache_file):
-                return
-            os.makedirs(_tts_cache_dir(), exist_ok=True)
-            payload = json.dumps({
-                "model": "kokoro",
-                "input": text,
-                "voice": voice,
-                "response_format": "mp3",
-                "speed": speed,
-                "volume_multiplier": volume,
-            }).encode()
-            req = Request(_TTS_KOKORO_URL, data=payload, headers={"Content-Type": "application/json"})
-            with urlopen(req, timeout=15) as resp:
-                audio_bytes = resp.read()
-            with open(cache_file, "wb") as f:
-                f.write(audio_bytes)
+            ensure_tts_file(_format_call_text(ticket_code, service_name, counter_name), voice, speed, volume)
         except Exception:
             pass  # Falha silenciosa — o endpoint /api/tts/call tentará de novo quando a TV pedir
 
@@ -1659,45 +2020,20 @@ def get_tts_call(ticket_code: str, counter_name: str = "", service_name: str = "
         voice = "pf_dora"
     speed = max(0.25, min(4.0, speed))
     volume = max(0.1, min(4.0, volume))
-    cache_dir = _tts_cache_dir()
-    os.makedirs(cache_dir, exist_ok=True)
     text = _format_call_text(ticket_code, service_name, counter_name)
-    cache_key = hashlib.md5(f"{text}|{voice}|{speed:.2f}|{volume:.2f}".encode()).hexdigest()
-    cache_file = os.path.join(cache_dir, f"{cache_key}.mp3")
-    if not os.path.isfile(cache_file):
-        payload = json.dumps({
-            "model": "kokoro",
-            "input": text,
-            "voice": voice,
-            "response_format": "mp3",
-            "speed": speed,
-            "volume_multiplier": volume,
-        }).encode()
-        try:
-            req = Request(_TTS_KOKORO_URL, data=payload, headers={"Content-Type": "application/json"})
-            with urlopen(req, timeout=15) as resp:
-                audio_bytes = resp.read()
-        except Exception as e:
-            raise HTTPException(status_code=503, detail=f"Kokoro TTS indisponível: {e}")
-        with open(cache_file, "wb") as f:
-            f.write(audio_bytes)
-    with open(cache_file, "rb") as f:
-        body = f.read()
-    return StreamingResponse(
-        iter([body]),
-        media_type="audio/mpeg",
-        headers={"Cache-Control": "public, max-age=86400"},
-    )
+    try:
+        cache_file = ensure_tts_file(text, voice, speed, volume)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Kokoro TTS indisponível: {e}")
+    return FileResponse(cache_file, media_type="audio/mpeg", headers=_IMMUTABLE_FILE_HEADERS)
 
 
 @app.get("/api/slides/{filename}")
-def serve_slide_image(filename: str):
+async def serve_slide_image(filename: str):
     """Serve slide images from .run/slides/ directory"""
-    import mimetypes
-    from pathlib import Path
     
     # Security: only allow alphanumeric, dash, underscore, and dot in filename
-    if not all(c.isalnum() or c in ('-', '_', '.') for c in filename):
+    if not _SAFE_FILENAME_RE.match(filename):
         raise HTTPException(status_code=400, detail="Invalid filename")
     
     base_dir = os.getcwd()
@@ -1716,24 +2052,15 @@ def serve_slide_image(filename: str):
     if not mime_type:
         mime_type = "image/png"
     
-    def generate():
-        with open(file_path, "rb") as f:
-            while True:
-                chunk = f.read(8192)
-                if not chunk:
-                    break
-                yield chunk
-    
-    return StreamingResponse(generate(), media_type=mime_type)
+    return FileResponse(file_path, media_type=mime_type, headers=_IMMUTABLE_FILE_HEADERS)
 
 
 @app.get("/api/slides/thumbs/{filename}")
-def serve_slide_thumbnail(filename: str):
+async def serve_slide_thumbnail(filename: str):
     """Serve slide thumbnails from .run/slides/thumbs/ directory"""
-    import mimetypes
     
     # Security: only allow alphanumeric, dash, underscore, and dot in filename
-    if not all(c.isalnum() or c in ('-', '_', '.') for c in filename):
+    if not _SAFE_FILENAME_RE.match(filename):
         raise HTTPException(status_code=400, detail="Invalid filename")
     
     base_dir = os.getcwd()
@@ -1749,24 +2076,20 @@ def serve_slide_thumbnail(filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     
     # Thumbnails são sempre JPEG
-    def generate():
-        with open(file_path, "rb") as f:
-            while True:
-                chunk = f.read(8192)
-                if not chunk:
-                    break
-                yield chunk
-    
-    return StreamingResponse(generate(), media_type="image/jpeg")
+    return FileResponse(file_path, media_type="image/jpeg", headers=_IMMUTABLE_FILE_HEADERS)
 
 
 @app.post("/tenant/logo")
-def tenant_set_logo(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    logo_base64 = (payload_in.get("logo_base64") or "").strip()
+def tenant_set_logo(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    # Tamanho e prefixo conferidos no valor bruto: payload grande é recusado antes de copiar a string no strip()
+    raw = payload_in.get("logo_base64") or ""
+    if not isinstance(raw, str):
+        raise HTTPException(status_code=400, detail="logo_base64 must be a string")
+    if len(raw) > 1_050_000:
+        raise HTTPException(status_code=413, detail="logo too large")
+    if raw and not raw[:64].lstrip().startswith("data:"):
+        raise HTTPException(status_code=400, detail="logo_base64 must be a data URL (data:...)")
+    logo_base64 = raw.strip()
     if not logo_base64:
         raise HTTPException(status_code=400, detail="logo_base64 is required")
 
@@ -1782,11 +2105,9 @@ def tenant_set_logo(payload_in: Dict[str, Any], authorization: Optional[str] = H
                 """,
                 (tenant_cpf_cnpj,),
             )
+        invalidate_tv_state()
         return {"ok": True}
 
-    # Expect a data URL: data:image/png;base64,... (preferred)
-    if not logo_base64.startswith("data:"):
-        raise HTTPException(status_code=400, detail="logo_base64 must be a data URL (data:...)")
     # Simple size guard (~1MB)
     if len(logo_base64) > 1_000_000:
         raise HTTPException(status_code=413, detail="logo too large")
@@ -1801,6 +2122,7 @@ def tenant_set_logo(payload_in: Dict[str, Any], authorization: Optional[str] = H
             """,
             (logo_base64, tenant_cpf_cnpj),
         )
+    invalidate_tv_state()
     return {"ok": True}
 
 
@@ -1858,10 +2180,7 @@ def auth_me(authorization: Optional[str] = Header(default=None)):
 
 
 @app.get("/tenant/users")
-def list_users(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+def list_users(tenant_cpf_cnpj: str = Depends(admin_tenant)):
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute(
@@ -1877,23 +2196,19 @@ def list_users(authorization: Optional[str] = Header(default=None)):
             (tenant_cpf_cnpj,),
         )
         users = cur.fetchall()
-        for u in users:
-            csv = u.pop("service_ids_csv") or ""
-            u["service_ids"] = [x for x in csv.split(",") if x]
-        return users
+    for u in users:
+        csv = u.pop("service_ids_csv") or ""
+        u["service_ids"] = [x for x in csv.split(",") if x]
+    return ORJSONResponse(users)
 
 
 @app.post("/tenant/users")
-def create_user(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    email = (payload_in.get("email") or "").strip().lower()
-    full_name = (payload_in.get("full_name") or "").strip() or None
-    role = (payload_in.get("role") or "operator").strip()
+def create_user(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    email = str_field(payload_in, "email").lower()
+    full_name = str_field(payload_in, "full_name") or None
+    role = str_field(payload_in, "role", "operator")
     password = payload_in.get("password") or ""
-    active = 1 if payload_in.get("active", True) else 0
+    active = to_bit(payload_in.get("active", True), "active")
     if role not in ("admin", "operator"):
         raise HTTPException(status_code=400, detail="Invalid role")
     if not email or not password:
@@ -1923,10 +2238,10 @@ def create_user(payload_in: Dict[str, Any], authorization: Optional[str] = Heade
 @app.post("/tenant/users/delete")
 def delete_user(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
     payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
+    require_role(payload, ADMIN_ROLES)
     tenant_cpf_cnpj = tenant_from_jwt(payload)
 
-    uid = (payload_in.get("id") or "").strip()
+    uid = str_field(payload_in, "id")
     if not uid:
         raise HTTPException(status_code=400, detail="id is required")
     if uid == (payload.get("sub") or ""):
@@ -1945,22 +2260,18 @@ def delete_user(payload_in: Dict[str, Any], authorization: Optional[str] = Heade
 def update_user(
     user_id: str,
     payload_in: Dict[str, Any],
-    authorization: Optional[str] = Header(default=None),
+    tenant_cpf_cnpj: str = Depends(admin_tenant),
 ):
     """Atualiza email, nome, tipo (role) e ativo. Senha opcional (só atualiza se enviada e não vazia)."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
     uid = (user_id or "").strip()
     if not uid:
         raise HTTPException(status_code=400, detail="user_id is required")
 
-    email = (payload_in.get("email") or "").strip().lower()
-    full_name = (payload_in.get("full_name") or "").strip() or None
-    role = (payload_in.get("role") or "operator").strip()
+    email = str_field(payload_in, "email").lower()
+    full_name = str_field(payload_in, "full_name") or None
+    role = str_field(payload_in, "role", "operator")
     active = payload_in.get("active")
-    password = (payload_in.get("password") or "").strip()
+    password = str_field(payload_in, "password")
 
     if role not in ("admin", "operator"):
         raise HTTPException(status_code=400, detail="role must be admin or operator")
@@ -1969,32 +2280,28 @@ def update_user(
     if active is None:
         raise HTTPException(status_code=400, detail="active is required")
 
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            "SELECT id FROM tenant_users WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (uid, tenant_cpf_cnpj),
-        )
-        if not cur.fetchone():
-            raise HTTPException(status_code=404, detail="User not found")
-
-        service_ids = [s for s in (payload_in.get("service_ids") or []) if s]
+    service_ids = [s for s in (payload_in.get("service_ids") or []) if s]
+    pw_hash = hash_password(password) if password else None
 
-        if password:
-            pw_hash = hash_password(password)
+    with db_conn() as conn:
+        cur = conn.cursor()
+        if pw_hash:
             cur.execute(
                 """UPDATE tenant_users
                    SET email = %s, full_name = %s, role = %s, active = %s, password_hash = %s
                    WHERE id = %s AND tenant_cpf_cnpj = %s""",
-                (email, full_name, role, 1 if active else 0, pw_hash, uid, tenant_cpf_cnpj),
+                (email, full_name, role, to_bit(active, "active"), pw_hash, uid, tenant_cpf_cnpj),
             )
         else:
             cur.execute(
                 """UPDATE tenant_users
                    SET email = %s, full_name = %s, role = %s, active = %s
                    WHERE id = %s AND tenant_cpf_cnpj = %s""",
-                (email, full_name, role, 1 if active else 0, uid, tenant_cpf_cnpj),
+                (email, full_name, role, to_bit(active, "active"), uid, tenant_cpf_cnpj),
             )
+        # O WHERE já restringe ao tenant: nenhuma linha encontrada = usuário inexistente (ou de outro tenant)
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="User not found")
         cur.execute("DELETE FROM operator_services WHERE operator_id = %s", (uid,))
         for svc_id in service_ids:
             cur.execute(
@@ -2007,10 +2314,10 @@ def update_user(
 @app.post("/tenant/users/toggle")
 def toggle_user(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
     payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
+    require_role(payload, ADMIN_ROLES)
     tenant_cpf_cnpj = tenant_from_jwt(payload)
 
-    uid = (payload_in.get("id") or "").strip()
+    uid = str_field(payload_in, "id")
     active = payload_in.get("active")
     if not uid:
         raise HTTPException(status_code=400, detail="id is required")
@@ -2023,37 +2330,115 @@ def toggle_user(payload_in: Dict[str, Any], authorization: Optional[str] = Heade
         cur = conn.cursor()
         cur.execute(
             "UPDATE tenant_users SET active = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (1 if active else 0, uid, tenant_cpf_cnpj),
+            (to_bit(active, "active"), uid, tenant_cpf_cnpj),
         )
     return {"ok": True}
 
 
+# Listas de guichês/serviços/avisos do admin por (tipo, tenant), já serializadas (bytes JSON).
+# Mudam pouco e são relidas a cada abertura de tela; as escritas chamam invalidate_tenant_list().
+_tenant_lists_cache = TTLCache(ttl=TENANT_LISTS_CACHE_TTL, maxsize=768)
+
+
+def invalidate_tenant_list(kind: Optional[str] = None, tenant_cpf_cnpj: Optional[str] = None) -> None:
+    """Descarta a lista em cache do tenant (ou todas, sem argumentos: seed)."""
+    if kind is None:
+        _tenant_lists_cache.clear()
+    else:
+        _tenant_lists_cache.pop((kind, tenant_cpf_cnpj))
+
+
+def _tenant_list_response(kind: str, tenant_cpf_cnpj: str, sql: str) -> Response:
+    key = (kind, tenant_cpf_cnpj)
+    body = _tenant_lists_cache.get(key)
+    if body is None:
+        with db_conn() as conn:
+            cur = conn.cursor(dictionary=True)
+            cur.execute(sql, (tenant_cpf_cnpj,))
+            body = dump_json(cur.fetchall())
+        _tenant_lists_cache.set(key, body)
+    return Response(content=body, media_type="application/json")
+
+
+def _tenant_item_routes(
+    path: str,
+    table: str,
+    name: str,
+    flag: str,
+    *,
+    delete_conflict: Optional[str] = None,
+    on_tv: bool = False,
+) -> Tuple[Any, Any]:
+    """Registra POST {path}/delete e {path}/toggle (admin, escopo do tenant) de um cadastro simples.
+
+    Guichês, serviços e avisos têm o mesmo par de rotas; muda a tabela, a coluna de ativação (`flag`),
+    a mensagem 409 quando há linhas vinculadas (`delete_conflict`) e se o item aparece na TV (`on_tv`).
+    """
+    kind = path.rsplit("/", 1)[-1]
+    delete_sql = f"DELETE FROM {table} WHERE id = %s AND tenant_cpf_cnpj = %s"
+    toggle_sql = f"UPDATE {table} SET {flag} = %s WHERE id = %s AND tenant_cpf_cnpj = %s"
+    flag_required = f"{flag} is required"
+
+    def after_write(tenant_cpf_cnpj: str) -> None:
+        invalidate_tenant_list(kind, tenant_cpf_cnpj)
+        if on_tv:
+            invalidate_tv_state()
+
+    def delete_item(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+        item_id = str_field(payload_in, "id")
+        if not item_id:
+            raise HTTPException(status_code=400, detail="id is required")
+
+        try:
+            with db_conn() as conn:
+                cur = conn.cursor()
+                cur.execute(delete_sql, (item_id, tenant_cpf_cnpj))
+        except mysql.connector.IntegrityError:
+            if delete_conflict is None:
+                raise
+            raise HTTPException(status_code=409, detail=delete_conflict)
+        after_write(tenant_cpf_cnpj)
+        return {"ok": True}
+
+    def toggle_item(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+        item_id = str_field(payload_in, "id")
+        value = payload_in.get(flag)
+        if not item_id:
+            raise HTTPException(status_code=400, detail="id is required")
+        if value is None:
+            raise HTTPException(status_code=400, detail=flag_required)
+
+        with db_conn() as conn:
+            cur = conn.cursor()
+            cur.execute(toggle_sql, (to_bit(value, flag), item_id, tenant_cpf_cnpj))
+        after_write(tenant_cpf_cnpj)
+        return {"ok": True}
+
+    delete_item.__name__ = f"delete_{name}"
+    toggle_item.__name__ = f"toggle_{name}"
+    app.post(f"{path}/delete")(delete_item)
+    app.post(f"{path}/toggle")(toggle_item)
+    return delete_item, toggle_item
+
+
 @app.get("/tenant/counters")
-def list_counters(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT id, name, active, created_at
-            FROM counters
-            WHERE tenant_cpf_cnpj = %s
-            ORDER BY created_at DESC
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        return cur.fetchall()
+def list_counters(tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    return _tenant_list_response(
+        "counters",
+        tenant_cpf_cnpj,
+        """
+        SELECT id, name, active, created_at
+        FROM counters
+        WHERE tenant_cpf_cnpj = %s
+        ORDER BY created_at DESC
+        """,
+    )
 
 
 @app.post("/tenant/counters")
-def create_counter(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    name = (payload_in.get("name") or "").strip()
-    active = 1 if payload_in.get("active", True) else 0
+def create_counter(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    name = str_field(payload_in, "name")
+    active = to_bit(payload_in.get("active", True), "active")
     if not name:
         raise HTTPException(status_code=400, detail="name is required")
     cid = str(uuid.uuid4())
@@ -2066,77 +2451,32 @@ def create_counter(payload_in: Dict[str, Any], authorization: Optional[str] = He
             """,
             (cid, tenant_cpf_cnpj, name, active),
         )
+    invalidate_tenant_list("counters", tenant_cpf_cnpj)
     return {"ok": True, "id": cid}
 
 
-@app.post("/tenant/counters/delete")
-def delete_counter(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    cid = (payload_in.get("id") or "").strip()
-    if not cid:
-        raise HTTPException(status_code=400, detail="id is required")
-
-    with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM counters WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (cid, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
-
-
-@app.post("/tenant/counters/toggle")
-def toggle_counter(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    cid = (payload_in.get("id") or "").strip()
-    active = payload_in.get("active")
-    if not cid:
-        raise HTTPException(status_code=400, detail="id is required")
-    if active is None:
-        raise HTTPException(status_code=400, detail="active is required")
-
-    with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE counters SET active = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (1 if active else 0, cid, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
+delete_counter, toggle_counter = _tenant_item_routes("/tenant/counters", "counters", "counter", "active")
 
 
 @app.get("/tenant/services")
-def list_services(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT id, name, priority_mode, active, created_at
-            FROM services
-            WHERE tenant_cpf_cnpj = %s
-            ORDER BY created_at DESC
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        return cur.fetchall()
+def list_services(tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    return _tenant_list_response(
+        "services",
+        tenant_cpf_cnpj,
+        """
+        SELECT id, name, priority_mode, active, created_at
+        FROM services
+        WHERE tenant_cpf_cnpj = %s
+        ORDER BY created_at DESC
+        """,
+    )
 
 
 @app.post("/tenant/services")
-def create_service(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    name = (payload_in.get("name") or "").strip()
-    priority_mode = (payload_in.get("priority_mode") or "normal").strip()
-    active = 1 if payload_in.get("active", True) else 0
+def create_service(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    name = str_field(payload_in, "name")
+    priority_mode = str_field(payload_in, "priority_mode", "normal")
+    active = to_bit(payload_in.get("active", True), "active")
     if priority_mode not in ("normal", "preferential"):
         raise HTTPException(status_code=400, detail="Invalid priority_mode")
     if not name:
@@ -2151,83 +2491,38 @@ def create_service(payload_in: Dict[str, Any], authorization: Optional[str] = He
             """,
             (sid, tenant_cpf_cnpj, name, priority_mode, active),
         )
+    invalidate_tenant_list("services", tenant_cpf_cnpj)
     return {"ok": True, "id": sid}
 
 
-@app.post("/tenant/services/delete")
-def delete_service(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    sid = (payload_in.get("id") or "").strip()
-    if not sid:
-        raise HTTPException(status_code=400, detail="id is required")
-
-    try:
-        with db_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                "DELETE FROM services WHERE id = %s AND tenant_cpf_cnpj = %s",
-                (sid, tenant_cpf_cnpj),
-            )
-    except mysql.connector.IntegrityError:
-        raise HTTPException(
-            status_code=409,
-            detail="Não é possível excluir este serviço pois há senhas vinculadas a ele. Desative-o em vez de excluir.",
-        )
-    return {"ok": True}
-
-
-@app.post("/tenant/services/toggle")
-def toggle_service(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    sid = (payload_in.get("id") or "").strip()
-    active = payload_in.get("active")
-    if not sid:
-        raise HTTPException(status_code=400, detail="id is required")
-    if active is None:
-        raise HTTPException(status_code=400, detail="active is required")
-
-    with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE services SET active = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (1 if active else 0, sid, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
+delete_service, toggle_service = _tenant_item_routes(
+    "/tenant/services",
+    "services",
+    "service",
+    "active",
+    delete_conflict="Não é possível excluir este serviço pois há senhas vinculadas a ele. Desative-o em vez de excluir.",
+)
 
 
 @app.get("/tenant/announcements")
-def list_tenant_announcements(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    with db_conn() as conn:
-        cur = conn.cursor(dictionary=True)
-        cur.execute(
-            """
-            SELECT id, message, position, enabled, created_at
-            FROM tenant_announcements
-            WHERE tenant_cpf_cnpj = %s
-            ORDER BY position ASC, created_at DESC
-            """,
-            (tenant_cpf_cnpj,),
-        )
-        return cur.fetchall()
+def list_tenant_announcements(tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    return _tenant_list_response(
+        "announcements",
+        tenant_cpf_cnpj,
+        """
+        SELECT id, message, position, enabled, created_at
+        FROM tenant_announcements
+        WHERE tenant_cpf_cnpj = %s
+        ORDER BY position ASC, created_at DESC
+        """,
+    )
 
 
 @app.post("/tenant/announcements")
-def create_tenant_announcement(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    message = (payload_in.get("message") or "").strip()
+def create_tenant_announcement(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    message = str_field(payload_in, "message")
     position = int(payload_in.get("position") or 1)
-    enabled = 1 if payload_in.get("enabled", True) else 0
+    enabled = to_bit(payload_in.get("enabled", True), "enabled")
     if not message:
         raise HTTPException(status_code=400, detail="message is required")
     if position < 1:
@@ -2242,89 +2537,60 @@ def create_tenant_announcement(payload_in: Dict[str, Any], authorization: Option
             """,
             (aid, tenant_cpf_cnpj, message, position, enabled),
         )
+    invalidate_tenant_list("announcements", tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "id": aid}
 
 
-@app.post("/tenant/announcements/delete")
-def delete_tenant_announcement(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-    aid = (payload_in.get("id") or "").strip()
-    if not aid:
-        raise HTTPException(status_code=400, detail="id is required")
-    with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM tenant_announcements WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (aid, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
+delete_tenant_announcement, toggle_tenant_announcement = _tenant_item_routes(
+    "/tenant/announcements", "tenant_announcements", "tenant_announcement", "enabled", on_tv=True
+)
 
 
-@app.post("/tenant/announcements/toggle")
-def toggle_tenant_announcement(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
+_TV_SETTINGS_SQL = (
+    "SELECT tv_theme, tv_audio_enabled, tv_call_sound, tv_video_muted, tv_video_paused, tts_enabled, tts_voice, tts_speed, tts_volume FROM tenants WHERE cpf_cnpj = %s"
+)
+# Gravação + releitura em um só execute() (multi-statement): o POST devolve o que ficou salvo
+_TV_SETTINGS_UPDATE_BATCH = """UPDATE tenants
+   SET tv_theme = %s, tv_audio_enabled = %s, tv_call_sound = %s, tv_video_muted = %s, tv_video_paused = %s,
+       tts_enabled = %s, tts_voice = %s, tts_speed = %s, tts_volume = %s
+   WHERE cpf_cnpj = %s;""" + _TV_SETTINGS_SQL
 
-    aid = (payload_in.get("id") or "").strip()
-    enabled = payload_in.get("enabled")
-    if not aid:
-        raise HTTPException(status_code=400, detail="id is required")
-    if enabled is None:
-        raise HTTPException(status_code=400, detail="enabled is required")
 
-    with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            "UPDATE tenant_announcements SET enabled = %s WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (1 if enabled else 0, aid, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
+def _tv_settings_from_row(row: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not row:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return {
+        "tv_theme": row.get("tv_theme") or "dark",
+        "tv_audio_enabled": bool(row.get("tv_audio_enabled", 1)),
+        "tv_call_sound": (row.get("tv_call_sound") or "").strip() or "notification-1.mp3",
+        "tv_video_muted": bool(row.get("tv_video_muted", 1)),
+        "tv_video_paused": bool(row.get("tv_video_paused", 0)),
+        "tts_enabled": bool(row.get("tts_enabled", 0)),
+        "tts_voice": (row.get("tts_voice") or "pf_dora").strip() or "pf_dora",
+        "tts_speed": float(row.get("tts_speed") or 0.85),
+        "tts_volume": float(row.get("tts_volume") or 1.0),
+    }
 
 
 @app.get("/tenant/tv-settings")
-def get_tenant_tv_settings(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
+def get_tenant_tv_settings(tenant_cpf_cnpj: str = Depends(admin_tenant)):
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
-        cur.execute(
-            "SELECT tv_theme, tv_audio_enabled, tv_call_sound, tv_video_muted, tv_video_paused, tts_enabled, tts_voice, tts_speed, tts_volume FROM tenants WHERE cpf_cnpj = %s",
-            (tenant_cpf_cnpj,),
-        )
+        cur.execute(_TV_SETTINGS_SQL, (tenant_cpf_cnpj,))
         row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="Tenant not found")
-        return {
-            "tv_theme": row.get("tv_theme") or "dark",
-            "tv_audio_enabled": bool(row.get("tv_audio_enabled", 1)),
-            "tv_call_sound": (row.get("tv_call_sound") or "").strip() or "notification-1.mp3",
-            "tv_video_muted": bool(row.get("tv_video_muted", 1)),
-            "tv_video_paused": bool(row.get("tv_video_paused", 0)),
-            "tts_enabled": bool(row.get("tts_enabled", 0)),
-            "tts_voice": (row.get("tts_voice") or "pf_dora").strip() or "pf_dora",
-            "tts_speed": float(row.get("tts_speed") or 0.85),
-            "tts_volume": float(row.get("tts_volume") or 1.0),
-        }
+    return _tv_settings_from_row(row)
 
 
 @app.post("/tenant/tv-settings")
-def set_tenant_tv_settings(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    tv_theme = (payload_in.get("tv_theme") or "dark").strip()
+def set_tenant_tv_settings(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    tv_theme = str_field(payload_in, "tv_theme", "dark")
     tv_audio_enabled = payload_in.get("tv_audio_enabled")
-    tv_call_sound = (payload_in.get("tv_call_sound") or "notification-1.mp3").strip() or "notification-1.mp3"
+    tv_call_sound = str_field(payload_in, "tv_call_sound", "notification-1.mp3")
     tv_video_muted = payload_in.get("tv_video_muted")
     tv_video_paused = payload_in.get("tv_video_paused")
     tts_enabled = payload_in.get("tts_enabled", False)
-    tts_voice = (payload_in.get("tts_voice") or "pf_dora").strip()
+    tts_voice = str_field(payload_in, "tts_voice", "pf_dora")
     tts_speed = float(payload_in.get("tts_speed") or 0.85)
     tts_volume = float(payload_in.get("tts_volume") or 1.0)
     tts_speed = max(0.25, min(4.0, tts_speed))
@@ -2339,36 +2605,55 @@ def set_tenant_tv_settings(payload_in: Dict[str, Any], authorization: Optional[s
     if tv_video_paused is None:
         raise HTTPException(status_code=400, detail="tv_video_paused is required")
     # Sanitize filename: only alphanumeric, dash, underscore, dot
-    if not all(c.isalnum() or c in ("-", "_", ".") for c in tv_call_sound):
+    if not _SAFE_FILENAME_RE.match(tv_call_sound):
         tv_call_sound = "notification-1.mp3"
     if tts_voice not in _TTS_VALID_VOICES:
         tts_voice = "pf_dora"
 
+    params = (
+        tv_theme, to_bit(tv_audio_enabled, "tv_audio_enabled"), tv_call_sound,
+        to_bit(tv_video_muted, "tv_video_muted"), to_bit(tv_video_paused, "tv_video_paused"),
+        to_bit(tts_enabled, "tts_enabled"), tts_voice, tts_speed, tts_volume, tenant_cpf_cnpj,
+        tenant_cpf_cnpj,
+    )
     with db_conn() as conn:
-        cur = conn.cursor()
-        cur.execute(
-            """UPDATE tenants
-               SET tv_theme = %s, tv_audio_enabled = %s, tv_call_sound = %s, tv_video_muted = %s, tv_video_paused = %s,
-                   tts_enabled = %s, tts_voice = %s, tts_speed = %s, tts_volume = %s
-               WHERE cpf_cnpj = %s""",
-            (tv_theme, 1 if tv_audio_enabled else 0, tv_call_sound, 1 if tv_video_muted else 0, 1 if tv_video_paused else 0,
-             1 if tts_enabled else 0, tts_voice, tts_speed, tts_volume, tenant_cpf_cnpj),
-        )
-    return {"ok": True}
+        cur = conn.cursor(dictionary=True)
+        cur.execute(_TV_SETTINGS_UPDATE_BATCH, params)
+        cur.nextset()
+        row = cur.fetchone()
+    invalidate_tv_state()
+    return {"ok": True, "settings": _tv_settings_from_row(row)}
+
+
+_RESET_DELETE_CHUNK = 5000
+
+
+def _delete_tenant_rows(cur, table: str, tenant_cpf_cnpj: str) -> int:
+    """Apaga as linhas do tenant em lotes de _RESET_DELETE_CHUNK (autocommit: cada lote é uma transação).
+
+    Mantém locks e undo log pequenos, sem segurar a tabela durante um DELETE de todo o histórico.
+    """
+    deleted = 0
+    while True:
+        cur.execute(f"DELETE FROM {table} WHERE tenant_cpf_cnpj = %s LIMIT {_RESET_DELETE_CHUNK}", (tenant_cpf_cnpj,))
+        deleted += cur.rowcount
+        if cur.rowcount < _RESET_DELETE_CHUNK:
+            return deleted
 
 
 @app.post("/tenant/reset-history")
-def tenant_reset_history(authorization: Optional[str] = Header(default=None)):
+def tenant_reset_history(tenant_cpf_cnpj: str = Depends(admin_tenant)):
     """Limpa todo o histórico de senhas/chamadas do tenant (tickets e calls). Apenas admin."""
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
     with db_conn() as conn:
         cur = conn.cursor()
-        cur.execute("DELETE FROM tickets WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        deleted_tickets = cur.rowcount
-        cur.execute("DELETE FROM calls WHERE tenant_cpf_cnpj = %s", (tenant_cpf_cnpj,))
-        deleted_calls = cur.rowcount
+        deleted_tickets = _delete_tenant_rows(cur, "tickets", tenant_cpf_cnpj)
+        deleted_calls = _delete_tenant_rows(cur, "calls", tenant_cpf_cnpj)
+        _delete_tenant_rows(cur, "tickets_daily_rollup", tenant_cpf_cnpj)
+    today = utc_today()
+    for days in (7, 30):
+        _dashboard_kpis_cache.pop((tenant_cpf_cnpj, days, today))
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {
         "ok": True,
         "deleted_tickets": deleted_tickets,
@@ -2377,11 +2662,7 @@ def tenant_reset_history(authorization: Optional[str] = Header(default=None)):
 
 
 @app.get("/tenant/admin-settings")
-def get_tenant_admin_settings(authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
+def get_tenant_admin_settings(tenant_cpf_cnpj: str = Depends(admin_tenant)):
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
         cur.execute(
@@ -2397,12 +2678,8 @@ def get_tenant_admin_settings(authorization: Optional[str] = Header(default=None
 
 
 @app.post("/tenant/admin-settings")
-def set_tenant_admin_settings(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
-    payload = require_jwt(authorization)
-    require_role(payload, {"admin"})
-    tenant_cpf_cnpj = tenant_from_jwt(payload)
-
-    admin_playlist_filter = (payload_in.get("admin_playlist_filter") or "all").strip()
+def set_tenant_admin_settings(payload_in: Dict[str, Any], tenant_cpf_cnpj: str = Depends(admin_tenant)):
+    admin_playlist_filter = str_field(payload_in, "admin_playlist_filter", "all")
     if admin_playlist_filter not in ("all", "videos", "slides"):
         raise HTTPException(status_code=400, detail="admin_playlist_filter must be 'all', 'videos', or 'slides'")
 
@@ -2412,6 +2689,7 @@ def set_tenant_admin_settings(payload_in: Dict[str, Any], authorization: Optiona
             "UPDATE tenants SET admin_playlist_filter = %s WHERE cpf_cnpj = %s",
             (admin_playlist_filter, tenant_cpf_cnpj),
         )
+    invalidate_tv_state()
     return {"ok": True}
 
 
@@ -2420,45 +2698,26 @@ def set_tenant_admin_settings(payload_in: Dict[str, Any], authorization: Optiona
 # ============================================================
 
 
-def get_next_ticket_number(conn, tenant_cpf_cnpj: str, ticket_prefix: str) -> int:
-    """Incrementa e retorna o próximo número de senha para o prefixo/dia."""
-    from datetime import date
-
-    today = date.today()
-    cur = conn.cursor(dictionary=True)
-
-    # Tentar atualizar sequência existente
-    cur.execute(
-        """
-        UPDATE ticket_sequences
-        SET current_number = current_number + 1
-        WHERE tenant_cpf_cnpj = %s AND ticket_prefix = %s AND sequence_date = %s
-        """,
-        (tenant_cpf_cnpj, ticket_prefix, today),
-    )
-
-    if cur.rowcount == 0:
-        # Criar nova sequência para o dia
-        seq_id = str(uuid.uuid4())
-        cur.execute(
-            """
-            INSERT INTO ticket_sequences (id, tenant_cpf_cnpj, ticket_prefix, current_number, sequence_date)
-            VALUES (%s, %s, %s, 1, %s)
-            ON DUPLICATE KEY UPDATE current_number = current_number + 1
-            """,
-            (seq_id, tenant_cpf_cnpj, ticket_prefix, today),
-        )
+def get_next_ticket_number(conn, tenant_cpf_cnpj: str, ticket_prefix: str) -> int:
+    """Incrementa e retorna o próximo número de senha para o prefixo/dia.
 
-    # Buscar número atual
+    Um único INSERT ... ON DUPLICATE KEY cria ou incrementa a sequência do dia; o número
+    alocado volta via LAST_INSERT_ID(expr) da própria conexão, sem reler a linha.
+    """
+    today = date.today()
+    cur = conn.cursor()
     cur.execute(
         """
-        SELECT current_number FROM ticket_sequences
-        WHERE tenant_cpf_cnpj = %s AND ticket_prefix = %s AND sequence_date = %s
+        INSERT INTO ticket_sequences (id, tenant_cpf_cnpj, ticket_prefix, current_number, sequence_date)
+        VALUES (%s, %s, %s, LAST_INSERT_ID(1), %s)
+        ON DUPLICATE KEY UPDATE current_number = LAST_INSERT_ID(current_number + 1)
         """,
-        (tenant_cpf_cnpj, ticket_prefix, today),
+        (str(uuid.uuid4()), tenant_cpf_cnpj, ticket_prefix, today),
     )
-    row = cur.fetchone()
-    return row["current_number"] if row else 1
+    if cur.lastrowid:
+        return int(cur.lastrowid)
+    cur.execute("SELECT LAST_INSERT_ID()")
+    return int(cur.fetchone()[0])
 
 
 def format_ticket_code(prefix: str, number: int) -> str:
@@ -2466,6 +2725,19 @@ def format_ticket_code(prefix: str, number: int) -> str:
     return f"{prefix}-{str(number).zfill(3)}"
 
 
+_EMIT_TICKET_BATCH = ";".join((
+    """
+    INSERT INTO tickets (id, tenant_cpf_cnpj, ticket_code, service_id, service_name, priority, status, issued_at)
+    VALUES (%s, %s, %s, %s, %s, %s, 'waiting', %s)
+    """,
+    # Coberta pelo índice (tenant_cpf_cnpj, status, issued_at) da migration 018
+    """
+    SELECT COUNT(*) AS pos FROM tickets
+    WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND issued_at < %s
+    """,
+))
+
+
 def emit_ticket_for_service(
     conn,
     tenant_cpf_cnpj: str,
@@ -2501,23 +2773,16 @@ def emit_ticket_for_service(
     ticket_id = str(uuid.uuid4())
     now = utc_now()
 
+    # INSERT + posição na fila em um só execute() (multi-statement, uma ida ao banco)
     cur.execute(
-        """
-        INSERT INTO tickets (id, tenant_cpf_cnpj, ticket_code, service_id, service_name, priority, status, issued_at)
-        VALUES (%s, %s, %s, %s, %s, %s, 'waiting', %s)
-        """,
-        (ticket_id, tenant_cpf_cnpj, ticket_code, service_id, service["name"], priority, now),
-    )
-
-    cur.execute(
-        """
-        SELECT COUNT(*) AS pos FROM tickets
-        WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND issued_at < %s
-        """,
-        (tenant_cpf_cnpj, now),
+        _EMIT_TICKET_BATCH,
+        (ticket_id, tenant_cpf_cnpj, ticket_code, service_id, service["name"], priority, now, tenant_cpf_cnpj, now),
     )
+    cur.nextset()
     position = (cur.fetchone() or {}).get("pos", 0) + 1
 
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {
         "ticket_id": ticket_id,
         "ticket_code": ticket_code,
@@ -2536,8 +2801,8 @@ def emit_ticket(payload_in: Dict[str, Any], authorization: Optional[str] = Heade
     """
     require_token(authorization)
 
-    service_id = (payload_in.get("service_id") or "").strip()
-    priority = (payload_in.get("priority") or "normal").strip()
+    service_id = str_field(payload_in, "service_id")
+    priority = str_field(payload_in, "priority", "normal")
     if not service_id:
         raise HTTPException(status_code=400, detail="service_id is required")
 
@@ -2556,6 +2821,49 @@ def emit_ticket(payload_in: Dict[str, Any], authorization: Optional[str] = Heade
 # ============================================================
 
 
+# Página pública de acompanhamento: HTML montado uma vez no import; por requisição só um format()
+_ACOMPANHAR_NOT_FOUND_HTML = """<!DOCTYPE html><html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width,initial-scale=1">
+<title>Senha não encontrada</title><style>body{font-family:sans-serif;max-width:360px;margin:2rem auto;padding:1rem;text-align:center;}
+h1{font-size:1.25rem;color:#666;}</style></head><body><h1>Senha não encontrada</h1><p>Verifique o link ou tente novamente.</p></body></html>""".encode("utf-8")
+_ACOMPANHAR_HTML = """<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+  <meta charset="utf-8">
+  <meta name="viewport" content="width=device-width,initial-scale=1">
+  <title>Acompanhamento – {ticket_code}</title>
+  <style>
+    body {{ font-family: system-ui, sans-serif; max-width: 360px; margin: 2rem auto; padding: 1rem; background: #f5f5f5; }}
+    .card {{ background: #fff; border-radius: 12px; padding: 1.5rem; box-shadow: 0 2px 8px rgba(0,0,0,.08); }}
+    .code {{ font-size: 2rem; font-weight: 800; letter-spacing: .1em; color: #0d6efd; margin: 0.5rem 0; }}
+    .status {{ font-weight: 600; color: #198754; margin: 0.5rem 0; }}
+    .status.called, .status.in_service {{ color: #0d6efd; }}
+    .meta {{ color: #666; font-size: 0.9rem; margin-top: 1rem; }}
+    p {{ margin: 0.25rem 0; }}
+  </style>
+</head>
+<body>
+  <div class="card">
+    <p class="meta">Sua senha</p>
+    <p class="code">{ticket_code}</p>
+    <p class="meta">{service_name}</p>
+    <p class="status">{status_msg}</p>
+    {position_html}
+    {counter_html}
+  </div>
+</body>
+</html>"""
+_ACOMPANHAR_STATUS_MSG = {
+    "waiting": "Aguardando na fila",
+    "called": "Chamada – dirija-se ao guichê",
+    "in_service": "Em atendimento",
+    "completed": "Atendimento finalizado",
+    "no_show": "Não compareceu",
+    "cancelled": "Cancelada",
+}
+_ACOMPANHAR_FINAL_STATUSES = frozenset(("completed", "no_show", "cancelled"))
+_ACOMPANHAR_FINAL_HEADERS = {"Cache-Control": "public, max-age=60"}
+
+
 @app.get("/acompanhar/{ticket_id}", response_class=HTMLResponse)
 def acompanhar_ticket(ticket_id: str):
     """
@@ -2576,71 +2884,37 @@ def acompanhar_ticket(ticket_id: str):
         )
         row = cur.fetchone()
 
+        # Posição na fila (somente se ainda aguardando): mesma conexão, issued_at já lido acima
+        position = None
+        if row and row["status"] == "waiting":
+            cur.execute(
+                """
+                SELECT COUNT(*) AS pos FROM tickets
+                WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND issued_at <= %s
+                """,
+                (row["tenant_cpf_cnpj"], row["issued_at"]),
+            )
+            position = cur.fetchone()["pos"]
+
     if not row:
-        return HTMLResponse(
-            content="""<!DOCTYPE html><html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width,initial-scale=1">
-<title>Senha não encontrada</title><style>body{font-family:sans-serif;max-width:360px;margin:2rem auto;padding:1rem;text-align:center;}
-h1{font-size:1.25rem;color:#666;}</style></head><body><h1>Senha não encontrada</h1><p>Verifique o link ou tente novamente.</p></body></html>""",
-            status_code=404,
-        )
+        return HTMLResponse(content=_ACOMPANHAR_NOT_FOUND_HTML, status_code=404)
 
     status = row.get("status") or "waiting"
     ticket_code = row.get("ticket_code") or "—"
     service_name = row.get("service_name") or ""
     counter_name = row.get("counter_name") or ""
-    tenant_cpf_cnpj = row.get("tenant_cpf_cnpj") or ""
 
-    # Posição na fila (somente se ainda aguardando)
-    position = None
-    if status == "waiting":
-        with db_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM tickets
-                WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND issued_at <= (SELECT issued_at FROM tickets WHERE id = %s)
-                """,
-                (tenant_cpf_cnpj, ticket_id.strip()),
-            )
-            position = (cur.fetchone() or (0,))[0]
-
-    status_msg = {
-        "waiting": "Aguardando na fila",
-        "called": "Chamada – dirija-se ao guichê",
-        "in_service": "Em atendimento",
-        "completed": "Atendimento finalizado",
-        "no_show": "Não compareceu",
-        "cancelled": "Cancelada",
-    }.get(status, status)
-
-    html = f"""<!DOCTYPE html>
-<html lang="pt-BR">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width,initial-scale=1">
-  <title>Acompanhamento – {ticket_code}</title>
-  <style>
-    body {{ font-family: system-ui, sans-serif; max-width: 360px; margin: 2rem auto; padding: 1rem; background: #f5f5f5; }}
-    .card {{ background: #fff; border-radius: 12px; padding: 1.5rem; box-shadow: 0 2px 8px rgba(0,0,0,.08); }}
-    .code {{ font-size: 2rem; font-weight: 800; letter-spacing: .1em; color: #0d6efd; margin: 0.5rem 0; }}
-    .status {{ font-weight: 600; color: #198754; margin: 0.5rem 0; }}
-    .status.called, .status.in_service {{ color: #0d6efd; }}
-    .meta {{ color: #666; font-size: 0.9rem; margin-top: 1rem; }}
-    p {{ margin: 0.25rem 0; }}
-  </style>
-</head>
-<body>
-  <div class="card">
-    <p class="meta">Sua senha</p>
-    <p class="code">{ticket_code}</p>
-    <p class="meta">{service_name}</p>
-    <p class="status">{status_msg}</p>
-    {f'<p class="meta">Posição na fila: {position}ª</p>' if position is not None else ''}
-    {f'<p class="meta">Guichê: {counter_name}</p>' if counter_name else ''}
-  </div>
-</body>
-</html>"""
-    return HTMLResponse(content=html)
+    status_msg = _ACOMPANHAR_STATUS_MSG.get(status, status)
+    html = _ACOMPANHAR_HTML.format(
+        ticket_code=ticket_code,
+        service_name=service_name,
+        status_msg=status_msg,
+        position_html=f'<p class="meta">Posição na fila: {position}ª</p>' if position is not None else "",
+        counter_html=f'<p class="meta">Guichê: {counter_name}</p>' if counter_name else "",
+    )
+    # Estados finais não mudam mais: repetidas leituras do QR podem vir do cache do navegador/proxy
+    headers = _ACOMPANHAR_FINAL_HEADERS if status in _ACOMPANHAR_FINAL_STATUSES else None
+    return HTMLResponse(content=html, headers=headers)
 
 
 # ============================================================
@@ -2668,30 +2942,86 @@ def totem_list_services(authorization: Optional[str] = Header(default=None)):
         return cur.fetchall()
 
 
+_TOTEM_AUDIT_SQL = """
+    INSERT INTO ticket_print_jobs
+      (id, tenant_cpf_cnpj, ticket_id, ticket_code, service_id, service_name, priority, counter_id, print_text, output_mode)
+    VALUES
+      (%s, %s, %s, %s, %s, %s, %s, NULL, %s, 'both')
+"""
+# Sem o nome do tenant em cache: busca junto com a auditoria, no mesmo execute()
+_TOTEM_RECEIPT_BATCH = "SELECT nome_fantasia, nome_razao_social FROM tenants WHERE cpf_cnpj = %s LIMIT 1;" + _TOTEM_AUDIT_SQL
+
+
+# Cópia em texto de cada senha emitida (.run/prints), gravada fora da requisição
+_FS_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ticket-fs")
+
+
+def _write_ticket_file(path: str, text: str) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    except Exception:
+        pass  # cópia local é só conveniência; a auditoria fica em ticket_print_jobs
+
+
 @app.post("/totem/emit")
 def totem_emit(payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
     require_token(authorization)
-    service_id = (payload_in.get("service_id") or "").strip()
+    service_id = str_field(payload_in, "service_id")
     if not service_id:
         raise HTTPException(status_code=400, detail="service_id is required")
     tenant_cpf_cnpj = resolve_tenant_cpf_cnpj()
     if not tenant_cpf_cnpj:
         raise HTTPException(status_code=400, detail="No active tenant")
 
+    print_job_id = str(uuid.uuid4())
+    # Uma única conexão do pool para emissão, nome do tenant e auditoria; devolvida antes da
+    # impressão e da gravação em disco (que podem demorar e não usam o banco)
     with db_conn() as conn:
         out = emit_ticket_for_service(conn, tenant_cpf_cnpj, service_id)
 
-    # Nome do tenant para o recibo (opcional)
-    tenant_name = None
-    try:
-        with db_conn() as conn:
+        # Minimal print text (raw), gravado na auditoria e em .run/prints abaixo
+        print_text = (
+            "CHAMADOR - TOTEM\\n"
+            f"TENANT: {tenant_cpf_cnpj}\\n"
+            "------------------------------\\n"
+            f"SENHA: {out['ticket_code']}\\n"
+            f"SERVIÇO: {out['service_name']}\\n"
+            f"PRIORIDADE: {out['priority']}\\n"
+            f"EMITIDO EM: {utc_now().strftime('%d/%m/%Y %H:%M:%S')}\\n"
+            "------------------------------\\n"
+            "Aguarde ser chamado no painel.\\n"
+        )
+
+        # Nome do tenant para o recibo (opcional) + audit in DB (ticket_print_jobs), em um só execute().
+        # O SELECT vem primeiro: se a auditoria falhar (erro só aparece no nextset), o nome já foi lido.
+        audit_params = (
+            print_job_id,
+            tenant_cpf_cnpj,
+            out["ticket_id"],
+            out["ticket_code"],
+            service_id,
+            out["service_name"],
+            out["priority"],
+            print_text,
+        )
+        cached_name = _tenant_name_cache.get(tenant_cpf_cnpj)
+        tenant_name = cached_name or None
+        try:
             cur = conn.cursor(dictionary=True)
-            cur.execute("SELECT nome_fantasia, nome_razao_social FROM tenants WHERE cpf_cnpj = %s LIMIT 1", (tenant_cpf_cnpj,))
-            row = cur.fetchone()
-            if row:
-                tenant_name = (row.get("nome_fantasia") or row.get("nome_razao_social") or "").strip() or None
-    except Exception:
-        pass
+            if cached_name is not None:
+                cur.execute(_TOTEM_AUDIT_SQL, audit_params)
+            else:
+                cur.execute(_TOTEM_RECEIPT_BATCH, (tenant_cpf_cnpj, *audit_params))
+                row = cur.fetchone()
+                name = (row.get("nome_fantasia") or row.get("nome_razao_social") or "").strip() if row else ""
+                _tenant_name_cache.set(tenant_cpf_cnpj, name)
+                tenant_name = name or None
+                cur.nextset()
+        except Exception:
+            # keep emitting working even if audit fails
+            pass
 
     # Logo do tenant no recibo (path do arquivo). Desativado por padrão para evitar travamento na impressora.
     logo_path = os.environ.get("TICKET_LOGO_PATH", "").strip()
@@ -2710,58 +3040,12 @@ def totem_emit(payload_in: Dict[str, Any], authorization: Optional[str] = Header
             device=os.environ.get("PRINTER_DEVICE") or "/dev/usb/lp1",
         )
 
-    # Minimal print text (raw). Later we will add DB audit + server file write.
-    print_text = (
-        "CHAMADOR - TOTEM\\n"
-        f"TENANT: {tenant_cpf_cnpj}\\n"
-        "------------------------------\\n"
-        f"SENHA: {out['ticket_code']}\\n"
-        f"SERVIÇO: {out['service_name']}\\n"
-        f"PRIORIDADE: {out['priority']}\\n"
-        f"EMITIDO EM: {utc_now().strftime('%d/%m/%Y %H:%M:%S')}\\n"
-        "------------------------------\\n"
-        "Aguarde ser chamado no painel.\\n"
-    )
-
-    # Save to server (.run/prints) + audit in DB (ticket_print_jobs)
-    saved_path = None
-    try:
-        base_dir = os.getcwd()
-        prints_dir = os.path.join(base_dir, ".run", "prints")
-        os.makedirs(prints_dir, exist_ok=True)
-        safe_code = (out.get("ticket_code") or "ticket").replace("/", "-")
-        fname = f"{safe_code}_{int(time.time())}.txt"
-        saved_path = os.path.join(prints_dir, fname)
-        with open(saved_path, "w", encoding="utf-8") as f:
-            f.write(print_text)
-    except Exception:
-        saved_path = None
-
-    print_job_id = str(uuid.uuid4())
-    try:
-        with db_conn() as conn:
-            cur = conn.cursor()
-            cur.execute(
-                """
-                INSERT INTO ticket_print_jobs
-                  (id, tenant_cpf_cnpj, ticket_id, ticket_code, service_id, service_name, priority, counter_id, print_text, output_mode)
-                VALUES
-                  (%s, %s, %s, %s, %s, %s, %s, NULL, %s, 'both')
-                """,
-                (
-                    print_job_id,
-                    tenant_cpf_cnpj,
-                    out["ticket_id"],
-                    out["ticket_code"],
-                    service_id,
-                    out["service_name"],
-                    out["priority"],
-                    print_text,
-                ),
-            )
-    except Exception:
-        # keep emitting working even if audit fails
-        pass
+    # Save to server (.run/prints) em segundo plano: a resposta não espera o disco.
+    # saved_path é o caminho pretendido (best-effort): se a gravação falhar o arquivo não existe;
+    # a referência confiável da emissão é print_job_id (ticket_print_jobs).
+    safe_code = (out.get("ticket_code") or "ticket").replace("/", "-")
+    saved_path = os.path.join(os.getcwd(), ".run", "prints", f"{safe_code}_{int(time.time())}.txt")
+    _FS_POOL.submit(_write_ticket_file, saved_path, print_text)
 
     return {"ok": True, **out, "print_text": print_text, "print_job_id": print_job_id, "saved_path": saved_path, "printed": printed}
 
@@ -2851,6 +3135,42 @@ def get_tickets_queue(
     return tickets
 
 
+# Senhas em espera por (serviço, prioridade), por tenant. Agregado uma vez e reaproveitado por
+# todos os operadores (cada um soma os próprios serviços); toda transição de senha passa por
+# invalidate_dashboard(), que descarta o tenant. O TTL só limita escritas feitas fora da API.
+_waiting_counts_cache = TTLCache(ttl=QUEUE_STATS_CACHE_TTL, maxsize=256)
+_waiting_counts_lock = threading.Lock()
+_waiting_counts_gen: Dict[str, int] = {}
+
+_WAITING_COUNTS_SQL = """
+SELECT service_id, priority, COUNT(*) AS count
+FROM tickets
+WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
+GROUP BY service_id, priority
+"""
+
+
+def _invalidate_waiting_counts(tenant_cpf_cnpj: str) -> None:
+    with _waiting_counts_lock:
+        _waiting_counts_gen[tenant_cpf_cnpj] = _waiting_counts_gen.get(tenant_cpf_cnpj, 0) + 1
+    _waiting_counts_cache.pop(tenant_cpf_cnpj)
+
+
+def _waiting_counts(cur, tenant_cpf_cnpj: str) -> List[Tuple[str, str, int]]:
+    """Contagem da fila de espera do tenant por (service_id, priority), do cache ou do banco."""
+    counts = _waiting_counts_cache.get(tenant_cpf_cnpj)
+    if counts is not None:
+        return counts
+    gen = _waiting_counts_gen.get(tenant_cpf_cnpj, 0)
+    cur.execute(_WAITING_COUNTS_SQL, (tenant_cpf_cnpj,))
+    counts = [(r["service_id"], r["priority"], int(r["count"])) for r in cur.fetchall()]
+    # Invalidado durante a consulta: devolve, mas não guarda (pode ser anterior à escrita)
+    with _waiting_counts_lock:
+        if gen == _waiting_counts_gen.get(tenant_cpf_cnpj, 0):
+            _waiting_counts_cache.set(tenant_cpf_cnpj, counts)
+    return counts
+
+
 @app.get("/tickets/queue/stats")
 def get_queue_stats(authorization: Optional[str] = Header(default=None)):
     """Estatísticas da fila (contadores). Respeita serviços do operador quando configurados."""
@@ -2865,40 +3185,81 @@ def get_queue_stats(authorization: Optional[str] = Header(default=None)):
             "SELECT service_id FROM operator_services WHERE operator_id = %s",
             (operator_id,),
         )
-        op_svc_ids = [r["service_id"] for r in cur.fetchall()]
+        op_svc_ids = {r["service_id"] for r in cur.fetchall()}
+        counts = _waiting_counts(cur, tenant_cpf_cnpj)
 
-        if op_svc_ids:
-            ph = ", ".join(["%s"] * len(op_svc_ids))
-            cur.execute(
-                f"""
-                SELECT priority, COUNT(*) AS count
-                FROM tickets
-                WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND service_id IN ({ph})
-                GROUP BY priority
-                """,
-                (tenant_cpf_cnpj, *op_svc_ids),
-            )
-        else:
-            cur.execute(
-                """
-                SELECT priority, COUNT(*) AS count
-                FROM tickets
-                WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
-                GROUP BY priority
-                """,
-                (tenant_cpf_cnpj,),
-            )
-        rows = cur.fetchall()
-        stats = {"normal": 0, "preferential": 0, "total": 0}
-        for r in rows:
-            p = r.get("priority", "normal")
-            c = int(r.get("count", 0))
-            stats[p] = c
-            stats["total"] += c
+    stats = {"normal": 0, "preferential": 0, "total": 0}
+    for service_id, priority, c in counts:
+        if op_svc_ids and service_id not in op_svc_ids:
+            continue
+        stats[priority] += c
+        stats["total"] += c
 
     return stats
 
 
+# Chamada de senha: uma linha mesmo sem guichê/operador/ticket (LEFT JOIN a partir de uma linha
+# fixa), para devolver o mesmo 404 de antes conforme o que faltou
+_CALL_TICKET_LOOKUP_SQL = """
+SELECT c.name AS counter_name, u.full_name AS operator_name,
+       t.id, t.status, t.ticket_code, t.service_id, t.service_name, t.priority,
+       EXISTS (SELECT 1 FROM operator_services WHERE operator_id = %s) AS op_services,
+       EXISTS (SELECT 1 FROM operator_services os WHERE os.operator_id = %s AND os.service_id = t.service_id)
+         AS op_service_match
+FROM (SELECT 1) AS one
+LEFT JOIN counters c ON c.id = %s AND c.tenant_cpf_cnpj = %s AND c.active = 1
+LEFT JOIN tenant_users u ON u.id = %s AND u.tenant_cpf_cnpj = %s
+LEFT JOIN tickets t ON t.id = %s AND t.tenant_cpf_cnpj = %s
+"""
+
+# Evento só é gravado se o UPDATE anterior (mesmo execute) pegou o ticket. Com FOUND_ROWS,
+# ROW_COUNT() conta as linhas encontradas, inclusive numa rechamada sem mudança de valores.
+_CALL_EVENT_INSERT_SQL = """
+INSERT INTO events (event_id, event_type, payload_json, created_at, synced)
+SELECT %s, %s, %s, %s, 0 FROM DUAL WHERE ROW_COUNT() > 0
+"""
+
+# UPDATE do ticket + evento para a TV (call_ticket soma a rechamada; call_next_ticket é a primeira).
+# O status é conferido no próprio UPDATE: entre a leitura e a escrita outro operador pode ter
+# chamado/finalizado a senha, e aí o UPDATE não pega nenhuma linha (cur.rowcount == 0).
+_CALL_TICKET_WRITE_BATCH = ";".join((
+    """
+    UPDATE tickets
+    SET status = 'called', called_at = %s, operator_id = %s, operator_name = %s,
+        counter_id = %s, counter_name = %s, recall_count = recall_count + 1
+    WHERE id = %s AND status IN ('waiting', 'called')
+    """,
+    _CALL_EVENT_INSERT_SQL,
+))
+_CALL_NEXT_WRITE_BATCH = ";".join((
+    """
+    UPDATE tickets
+    SET status = 'called', called_at = %s, operator_id = %s, operator_name = %s,
+        counter_id = %s, counter_name = %s, recall_count = 1
+    WHERE id = %s AND status = 'waiting'
+    """,
+    _CALL_EVENT_INSERT_SQL,
+))
+# Tentativas do call-next quando a senha escolhida é chamada por outro guichê no meio
+_CALL_NEXT_ATTEMPTS = 3
+
+
+def _ticket_transition_error(cur, ticket_id: str, tenant_cpf_cnpj: str, action: str) -> HTTPException:
+    """Erro de uma transição de status que não pegou o ticket (UPDATE condicional com rowcount 0)."""
+    cur.execute("SELECT status FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s", (ticket_id, tenant_cpf_cnpj))
+    row = cur.fetchone()
+    if not row:
+        return HTTPException(status_code=404, detail="Ticket not found")
+    return HTTPException(status_code=400, detail=f"Ticket cannot be {action} (status: {row['status']})")
+
+# Operador, guichê e serviços do operador (call_next_ticket), em um só execute()
+_CALL_NEXT_LOOKUP_BATCH = ";".join((
+    "SELECT id, full_name FROM tenant_users WHERE id = %s AND tenant_cpf_cnpj = %s",
+    "SELECT id, name FROM counters WHERE id = %s AND tenant_cpf_cnpj = %s AND active = 1",
+    "SELECT service_id FROM operator_services WHERE operator_id = %s",
+))
+
+
 @app.post("/tickets/{ticket_id}/call")
 def call_ticket(ticket_id: str, payload_in: Dict[str, Any], authorization: Optional[str] = Header(default=None)):
     """
@@ -2909,48 +3270,30 @@ def call_ticket(ticket_id: str, payload_in: Dict[str, Any], authorization: Optio
     tenant_cpf_cnpj = tenant_from_jwt(payload)
     operator_id = payload.get("sub")
 
-    counter_id = (payload_in.get("counter_id") or "").strip()
+    counter_id = str_field(payload_in, "counter_id")
     if not counter_id:
         raise HTTPException(status_code=400, detail="counter_id is required")
 
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
 
-        # Buscar operador
-        cur.execute(
-            "SELECT id, full_name FROM tenant_users WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (operator_id, tenant_cpf_cnpj),
-        )
-        operator = cur.fetchone()
-        operator_name = operator.get("full_name") if operator else None
-
-        # Buscar guichê
-        cur.execute(
-            "SELECT id, name FROM counters WHERE id = %s AND tenant_cpf_cnpj = %s AND active = 1",
-            (counter_id, tenant_cpf_cnpj),
-        )
-        counter = cur.fetchone()
-        if not counter:
-            raise HTTPException(status_code=404, detail="Counter not found")
-
-        # Buscar ticket
+        # Guichê, operador, ticket e serviços do operador em uma consulta (sempre uma linha)
         cur.execute(
-            "SELECT * FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (ticket_id, tenant_cpf_cnpj),
+            _CALL_TICKET_LOOKUP_SQL,
+            (operator_id, operator_id, counter_id, tenant_cpf_cnpj, operator_id, tenant_cpf_cnpj, ticket_id, tenant_cpf_cnpj),
         )
         ticket = cur.fetchone()
-        if not ticket:
+        if ticket["counter_name"] is None:
+            raise HTTPException(status_code=404, detail="Counter not found")
+        counter = {"id": counter_id, "name": ticket["counter_name"]}
+        operator_name = ticket["operator_name"]
+        if ticket["id"] is None:
             raise HTTPException(status_code=404, detail="Ticket not found")
         if ticket["status"] not in ("waiting", "called"):
             raise HTTPException(status_code=400, detail=f"Ticket cannot be called (status: {ticket['status']})")
 
         # Se o operador tem serviços atribuídos, só pode chamar ticket desse(s) serviço(s)
-        cur.execute(
-            "SELECT service_id FROM operator_services WHERE operator_id = %s",
-            (operator_id,),
-        )
-        op_svc_ids = [r["service_id"] for r in cur.fetchall()]
-        if op_svc_ids and ticket.get("service_id") not in op_svc_ids:
+        if ticket["op_services"] and not ticket["op_service_match"]:
             raise HTTPException(
                 status_code=403,
                 detail="Este ticket não pertence aos serviços que você atende.",
@@ -2958,15 +3301,6 @@ def call_ticket(ticket_id: str, payload_in: Dict[str, Any], authorization: Optio
 
         is_recall = ticket["status"] == "called"
         now = utc_now()
-        cur.execute(
-            """
-            UPDATE tickets
-            SET status = 'called', called_at = %s, operator_id = %s, operator_name = %s,
-                counter_id = %s, counter_name = %s, recall_count = recall_count + 1
-            WHERE id = %s
-            """,
-            (now, operator_id, operator_name, counter_id, counter["name"], ticket_id),
-        )
 
         # Criar evento SSE para TV
         # Rechamadas usam "ticket.recalled" para bypassar deduplicação na TV
@@ -2984,15 +3318,22 @@ def call_ticket(ticket_id: str, payload_in: Dict[str, Any], authorization: Optio
                 "is_recall": is_recall,
             }
         }
+        # UPDATE do ticket + evento em um só execute() (multi-statement, uma ida ao banco)
         cur.execute(
-            """
-            INSERT INTO events (event_id, event_type, payload_json, created_at, synced)
-            VALUES (%s, %s, %s, %s, 0)
-            """,
-            (event_id, event_type, json.dumps(event_payload, ensure_ascii=False), now),
+            _CALL_TICKET_WRITE_BATCH,
+            (
+                now, operator_id, operator_name, counter_id, counter["name"], ticket_id,
+                event_id, event_type, dump_json(event_payload).decode(), now,
+            ),
         )
+        called = cur.rowcount
+        cur.nextset()
+        if not called:
+            raise _ticket_transition_error(cur, ticket_id, tenant_cpf_cnpj, "called")
 
     _prefetch_tts(tenant_cpf_cnpj, ticket["ticket_code"], ticket["service_name"] or "", counter["name"])
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "ticket_id": ticket_id, "status": "called", "counter_name": counter["name"], "is_recall": is_recall}
 
 
@@ -3005,25 +3346,43 @@ def start_ticket_service(ticket_id: str, authorization: Optional[str] = Header(d
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
 
+        # Status conferido no próprio UPDATE; só lê o ticket para explicar a recusa
         cur.execute(
-            "SELECT * FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (ticket_id, tenant_cpf_cnpj),
-        )
-        ticket = cur.fetchone()
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-        if ticket["status"] != "called":
-            raise HTTPException(status_code=400, detail=f"Ticket cannot be started (status: {ticket['status']})")
-
-        now = utc_now()
-        cur.execute(
-            "UPDATE tickets SET status = 'in_service', service_started_at = %s WHERE id = %s",
-            (now, ticket_id),
+            """
+            UPDATE tickets SET status = 'in_service', service_started_at = %s
+            WHERE id = %s AND tenant_cpf_cnpj = %s AND status = 'called'
+            """,
+            (utc_now(), ticket_id, tenant_cpf_cnpj),
         )
+        if not cur.rowcount:
+            raise _ticket_transition_error(cur, ticket_id, tenant_cpf_cnpj, "started")
 
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "ticket_id": ticket_id, "status": "in_service"}
 
 
+# Soma um ticket recém-concluído ao tickets_daily_rollup (migration 019)
+_ROLLUP_COMPLETED_SQL = """
+INSERT INTO tickets_daily_rollup
+  (tenant_cpf_cnpj, day, operator_id, priority, operator_name,
+   completed_count, timed_count, sum_service_sec, min_service_sec, max_service_sec)
+SELECT tenant_cpf_cnpj, DATE(completed_at), COALESCE(operator_id, ''), priority, operator_name,
+       1, service_sec IS NOT NULL, COALESCE(service_sec, 0), service_sec, service_sec
+FROM tickets WHERE id = %s
+ON DUPLICATE KEY UPDATE
+  operator_name = COALESCE(VALUES(operator_name), operator_name),
+  completed_count = completed_count + 1,
+  timed_count = timed_count + VALUES(timed_count),
+  sum_service_sec = sum_service_sec + VALUES(sum_service_sec),
+  min_service_sec = LEAST(COALESCE(min_service_sec, VALUES(min_service_sec)), COALESCE(VALUES(min_service_sec), min_service_sec)),
+  max_service_sec = GREATEST(COALESCE(max_service_sec, VALUES(max_service_sec)), COALESCE(VALUES(max_service_sec), max_service_sec))
+"""
+
+# Após finalizar: soma no agregado e lê os horários para a duração, em um só execute()
+_COMPLETE_TICKET_BATCH = _ROLLUP_COMPLETED_SQL + ";SELECT service_started_at, called_at FROM tickets WHERE id = %s"
+
+
 @app.post("/tickets/{ticket_id}/complete")
 def complete_ticket(ticket_id: str, authorization: Optional[str] = Header(default=None)):
     """Finalizar atendimento de uma senha."""
@@ -3033,21 +3392,20 @@ def complete_ticket(ticket_id: str, authorization: Optional[str] = Header(defaul
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
 
-        cur.execute(
-            "SELECT * FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (ticket_id, tenant_cpf_cnpj),
-        )
-        ticket = cur.fetchone()
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-        if ticket["status"] not in ("called", "in_service"):
-            raise HTTPException(status_code=400, detail=f"Ticket cannot be completed (status: {ticket['status']})")
-
         now = utc_now()
         cur.execute(
-            "UPDATE tickets SET status = 'completed', completed_at = %s WHERE id = %s",
-            (now, ticket_id),
+            """
+            UPDATE tickets SET status = 'completed', completed_at = %s
+            WHERE id = %s AND tenant_cpf_cnpj = %s AND status IN ('called', 'in_service')
+            """,
+            (now, ticket_id, tenant_cpf_cnpj),
         )
+        # Só quem efetivamente mudou o status contabiliza no agregado (evita dupla contagem em corrida)
+        if not cur.rowcount:
+            raise _ticket_transition_error(cur, ticket_id, tenant_cpf_cnpj, "completed")
+        cur.execute(_COMPLETE_TICKET_BATCH, (ticket_id, ticket_id))
+        cur.nextset()
+        ticket = cur.fetchone() or {}
 
         # Calcular duração
         started = ticket.get("service_started_at") or ticket.get("called_at")
@@ -3056,6 +3414,8 @@ def complete_ticket(ticket_id: str, authorization: Optional[str] = Header(defaul
             started_utc = started.replace(tzinfo=timezone.utc)
             duration_seconds = int((now - started_utc).total_seconds())
 
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "ticket_id": ticket_id, "status": "completed", "duration_seconds": duration_seconds}
 
 
@@ -3069,21 +3429,17 @@ def ticket_no_show(ticket_id: str, authorization: Optional[str] = Header(default
         cur = conn.cursor(dictionary=True)
 
         cur.execute(
-            "SELECT * FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (ticket_id, tenant_cpf_cnpj),
-        )
-        ticket = cur.fetchone()
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-        if ticket["status"] not in ("called", "in_service"):
-            raise HTTPException(status_code=400, detail=f"Ticket cannot be marked as no-show (status: {ticket['status']})")
-
-        now = utc_now()
-        cur.execute(
-            "UPDATE tickets SET status = 'no_show', completed_at = %s WHERE id = %s",
-            (now, ticket_id),
+            """
+            UPDATE tickets SET status = 'no_show', completed_at = %s
+            WHERE id = %s AND tenant_cpf_cnpj = %s AND status IN ('called', 'in_service')
+            """,
+            (utc_now(), ticket_id, tenant_cpf_cnpj),
         )
+        if not cur.rowcount:
+            raise _ticket_transition_error(cur, ticket_id, tenant_cpf_cnpj, "marked as no-show")
 
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "ticket_id": ticket_id, "status": "no_show"}
 
 
@@ -3097,21 +3453,17 @@ def cancel_ticket(ticket_id: str, authorization: Optional[str] = Header(default=
         cur = conn.cursor(dictionary=True)
 
         cur.execute(
-            "SELECT * FROM tickets WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (ticket_id, tenant_cpf_cnpj),
-        )
-        ticket = cur.fetchone()
-        if not ticket:
-            raise HTTPException(status_code=404, detail="Ticket not found")
-        if ticket["status"] in ("completed", "cancelled"):
-            raise HTTPException(status_code=400, detail=f"Ticket cannot be cancelled (status: {ticket['status']})")
-
-        now = utc_now()
-        cur.execute(
-            "UPDATE tickets SET status = 'cancelled', completed_at = %s WHERE id = %s",
-            (now, ticket_id),
+            """
+            UPDATE tickets SET status = 'cancelled', completed_at = %s
+            WHERE id = %s AND tenant_cpf_cnpj = %s AND status NOT IN ('completed', 'cancelled')
+            """,
+            (utc_now(), ticket_id, tenant_cpf_cnpj),
         )
+        if not cur.rowcount:
+            raise _ticket_transition_error(cur, ticket_id, tenant_cpf_cnpj, "cancelled")
 
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {"ok": True, "ticket_id": ticket_id, "status": "cancelled"}
 
 
@@ -3125,44 +3477,30 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
     tenant_cpf_cnpj = tenant_from_jwt(payload)
     operator_id = payload.get("sub")
 
-    counter_id = (payload_in.get("counter_id") or "").strip()
-    priority = (payload_in.get("priority") or "").strip()
+    counter_id = str_field(payload_in, "counter_id")
+    priority = str_field(payload_in, "priority")
     if not counter_id:
         raise HTTPException(status_code=400, detail="counter_id is required")
 
     with db_conn() as conn:
         cur = conn.cursor(dictionary=True)
 
-        # Buscar operador
-        cur.execute(
-            "SELECT id, full_name FROM tenant_users WHERE id = %s AND tenant_cpf_cnpj = %s",
-            (operator_id, tenant_cpf_cnpj),
-        )
-        operator = cur.fetchone()
-        operator_name = operator.get("full_name") if operator else None
-
-        # Buscar guichê
-        cur.execute(
-            "SELECT id, name FROM counters WHERE id = %s AND tenant_cpf_cnpj = %s AND active = 1",
-            (counter_id, tenant_cpf_cnpj),
+        # Operador, guichê e serviços atribuídos ao operador
+        operators, counters, op_services = fetch_result_sets(
+            cur, _CALL_NEXT_LOOKUP_BATCH, (operator_id, tenant_cpf_cnpj, counter_id, tenant_cpf_cnpj, operator_id)
         )
-        counter = cur.fetchone()
-        if not counter:
+        operator_name = operators[0].get("full_name") if operators else None
+        if not counters:
             raise HTTPException(status_code=404, detail="Counter not found")
-
-        # Verificar serviços atribuídos ao operador
-        cur.execute(
-            "SELECT service_id FROM operator_services WHERE operator_id = %s",
-            (operator_id,),
-        )
-        op_svc_ids = [r["service_id"] for r in cur.fetchall()]
+        counter = counters[0]
+        op_svc_ids = [r["service_id"] for r in op_services]
 
         # Buscar próximo ticket (preferencial primeiro, se não filtrado)
         # Se o operador tiver serviços atribuídos, filtra apenas por eles
         if op_svc_ids:
             ph = ", ".join(["%s"] * len(op_svc_ids))
             if priority == "preferential":
-                cur.execute(
+                next_query = (
                     f"""
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
@@ -3173,7 +3511,7 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                     (tenant_cpf_cnpj, *op_svc_ids),
                 )
             elif priority == "normal":
-                cur.execute(
+                next_query = (
                     f"""
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
@@ -3184,7 +3522,7 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                     (tenant_cpf_cnpj, *op_svc_ids),
                 )
             else:
-                cur.execute(
+                next_query = (
                     f"""
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
@@ -3196,7 +3534,7 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                 )
         else:
             if priority == "preferential":
-                cur.execute(
+                next_query = (
                     """
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND priority = 'preferential'
@@ -3206,7 +3544,7 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                     (tenant_cpf_cnpj,),
                 )
             elif priority == "normal":
-                cur.execute(
+                next_query = (
                     """
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting' AND priority = 'normal'
@@ -3217,7 +3555,7 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                 )
             else:
                 # Prioridade: preferencial > normal (por ordem de emissão dentro de cada grupo)
-                cur.execute(
+                next_query = (
                     """
                     SELECT * FROM tickets
                     WHERE tenant_cpf_cnpj = %s AND status = 'waiting'
@@ -3227,43 +3565,47 @@ def call_next_ticket(payload_in: Dict[str, Any], authorization: Optional[str] =
                     (tenant_cpf_cnpj,),
                 )
 
-        ticket = cur.fetchone()
-        if not ticket:
-            raise HTTPException(status_code=404, detail="No tickets waiting in queue")
-
-        now = utc_now()
-        cur.execute(
-            """
-            UPDATE tickets
-            SET status = 'called', called_at = %s, operator_id = %s, operator_name = %s,
-                counter_id = %s, counter_name = %s, recall_count = 1
-            WHERE id = %s
-            """,
-            (now, operator_id, operator_name, counter_id, counter["name"], ticket["id"]),
-        )
-
-        # Criar evento SSE para TV
-        event_id = str(uuid.uuid4())
-        event_payload = {
-            "call": {
-                "id": ticket["id"],
-                "ticket_code": ticket["ticket_code"],
-                "service_name": ticket["service_name"],
-                "priority": ticket["priority"],
-                "counter_name": counter["name"],
-                "operator_name": operator_name,
-                "called_at": now.isoformat(),
+        # A senha escolhida pode ser chamada por outro guichê entre o SELECT e o UPDATE
+        # (o UPDATE exige status 'waiting'): nesse caso, busca a próxima
+        for _ in range(_CALL_NEXT_ATTEMPTS):
+            cur.execute(*next_query)
+            ticket = cur.fetchone()
+            if not ticket:
+                raise HTTPException(status_code=404, detail="No tickets waiting in queue")
+
+            now = utc_now()
+
+            # Criar evento SSE para TV
+            event_id = str(uuid.uuid4())
+            event_payload = {
+                "call": {
+                    "id": ticket["id"],
+                    "ticket_code": ticket["ticket_code"],
+                    "service_name": ticket["service_name"],
+                    "priority": ticket["priority"],
+                    "counter_name": counter["name"],
+                    "operator_name": operator_name,
+                    "called_at": now.isoformat(),
+                }
             }
-        }
-        cur.execute(
-            """
-            INSERT INTO events (event_id, event_type, payload_json, created_at, synced)
-            VALUES (%s, %s, %s, %s, 0)
-            """,
-            (event_id, "ticket.called", json.dumps(event_payload, ensure_ascii=False), now),
-        )
+            # UPDATE do ticket + evento em um só execute() (multi-statement, uma ida ao banco)
+            cur.execute(
+                _CALL_NEXT_WRITE_BATCH,
+                (
+                    now, operator_id, operator_name, counter_id, counter["name"], ticket["id"],
+                    event_id, "ticket.called", dump_json(event_payload).decode(), now,
+                ),
+            )
+            called = cur.rowcount
+            cur.nextset()
+            if called:
+                break
+        else:
+            raise HTTPException(status_code=409, detail="Tickets are being called by other counters, try again")
 
     _prefetch_tts(tenant_cpf_cnpj, ticket["ticket_code"], ticket["service_name"] or "", counter["name"])
+    invalidate_dashboard(tenant_cpf_cnpj)
+    invalidate_tv_state()
     return {
         "ok": True,
         "ticket_id": ticket["id"],
@@ -3319,7 +3661,7 @@ def get_tickets_history(
             """
             SELECT id, ticket_code, service_name, priority, status, counter_name, operator_name,
                    called_at, service_started_at, completed_at,
-                   TIMESTAMPDIFF(SECOND, service_started_at, completed_at) as duration_seconds
+                   service_sec AS duration_seconds
             FROM tickets
             WHERE tenant_cpf_cnpj = %s AND status IN ('completed', 'no_show', 'cancelled')
             ORDER BY completed_at DESC
@@ -3496,9 +3838,10 @@ def create_call(payload: Dict[str, Any], authorization: Optional[str] = Header(d
             INSERT INTO events (event_id, event_type, payload_json, created_at, synced)
             VALUES (%s, %s, %s, %s, 0)
             """,
-            (event_id, "call.created", json.dumps(event_payload, ensure_ascii=False), now),
+            (event_id, "call.created", dump_json(event_payload).decode(), now),
         )
 
+    invalidate_tv_state()
     return {"ok": True, "event_id": event_id, "call_id": call_id}
 
 
@@ -3515,7 +3858,7 @@ def tv_events(
 ):
     # EventSource can't send headers; allow ?token=... for MVP.
     if token:
-        if token != DEVICE_TOKEN:
+        if not device_token_matches(token):
             raise HTTPException(status_code=403, detail="Invalid token")
     else:
         require_token(authorization)
@@ -1,15 +1,25 @@
+import hashlib
 import os
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import AbstractSet, Any, Dict, Optional
 
 import bcrypt
 import jwt
 from fastapi import HTTPException
 
+from .cache import TTLCache
+
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-jwt-secret-change-me")
 JWT_ISSUER = os.getenv("JWT_ISSUER", "chamador-edge")
 JWT_TTL_MINUTES = int(os.getenv("JWT_TTL_MINUTES", "720"))  # 12h default
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "30"))
+JWT_CACHE_ENABLED = os.getenv("JWT_CACHE_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Tokens já validados, para não refazer a verificação HS256 a cada requisição.
+# Chave = SHA-256 do token: tamanho fixo e o bearer token não fica guardado em memória.
+_jwt_cache = TTLCache(ttl=JWT_CACHE_TTL, maxsize=10000)
 
 
 def hash_password(password: str) -> str:
@@ -49,7 +59,25 @@ def decode_access_token(token: str) -> Dict[str, Any]:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def require_role(payload: Dict[str, Any], allowed: set[str]):
+def decode_access_token_cached(token: str) -> Dict[str, Any]:
+    """decode_access_token com cache por até JWT_CACHE_TTL segundos (nunca além do exp).
+
+    JWT_CACHE_ENABLED=0 desliga o cache (toda requisição verifica a assinatura).
+    """
+    if not JWT_CACHE_ENABLED:
+        return decode_access_token(token)
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _jwt_cache.get(key)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+    payload = decode_access_token(token)  # falha levanta 401 e nunca entra no cache
+    ttl = min(JWT_CACHE_TTL, float(payload.get("exp", 0)) - time.time())
+    if ttl > 0:
+        _jwt_cache.set(key, payload, ttl=ttl)
+    return payload
+
+
+def require_role(payload: Dict[str, Any], allowed: AbstractSet[str]):
     role = payload.get("role")
     if role not in allowed:
         raise HTTPException(status_code=403, detail="Insufficient permissions")
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Cache em memória do processo, thread-safe, com expiração por item e limite de tamanho.
+
+    Ao passar de `maxsize`, descarta os itens gravados há mais tempo.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SWRCache:
+    """Cache stale-while-revalidate em memória do processo.
+
+    Até `fresh_for` segundos o valor é servido direto; entre `fresh_for` e `stale_for` o valor
+    antigo é servido e uma única thread em segundo plano recalcula; depois disso (ou após
+    `invalidate`) a requisição recalcula de forma síncrona.
+    """
+
+    def __init__(self, fresh_for: float, stale_for: float, maxsize: int = 256):
+        self.fresh_for = fresh_for
+        self._cache = TTLCache(ttl=stale_for, maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self._gen = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        item = self._cache.get(key)
+        if item is None:
+            return self._compute(key, compute)
+        computed_at, value = item
+        if time.monotonic() - computed_at >= self.fresh_for:
+            with self._lock:
+                start = key not in self._refreshing
+                if start:
+                    self._refreshing.add(key)
+            if start:
+                threading.Thread(target=self._refresh, args=(key, compute), daemon=True).start()
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._gen += 1
+        self._cache.pop(key)
+
+    def _compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        gen = self._gen
+        computed_at = time.monotonic()
+        value = compute()
+        # Invalidado durante o cálculo: devolve o valor, mas não guarda (pode ser anterior à escrita)
+        with self._lock:
+            if gen == self._gen:
+                self._cache.set(key, (computed_at, value))
+        return value
+
+    def _refresh(self, key: Hashable, compute: Callable[[], Any]) -> None:
+        try:
+            self._compute(key, compute)
+        except Exception:
+            pass  # mantém o valor antigo; a próxima requisição após stale_for recalcula
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
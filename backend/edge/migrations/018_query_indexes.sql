@@ -0,0 +1,10 @@
+-- Migration 018: query_indexes.sql
+-- Índices para a fila de espera (/tv/state, emissão, /acompanhar) e para as chamadas do dia
+-- no dashboard. O filtro "de hoje" é um intervalo (col >= dia AND col < dia seguinte, datas
+-- passadas como parâmetro), então usa o índice em vez de varrer as linhas do tenant.
+
+-- Fila de espera ordenada por emissão (idx_tickets_tenant_waiting tem priority no meio e força filesort)
+CREATE INDEX idx_tickets_tenant_status_issued ON tickets(tenant_cpf_cnpj, status, issued_at);
+
+-- Chamadas legadas do dia (dashboard), sem filtro de status
+CREATE INDEX idx_calls_tenant_called ON calls(tenant_cpf_cnpj, called_at);
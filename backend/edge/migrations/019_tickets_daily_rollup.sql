@@ -0,0 +1,38 @@
+-- Migration 019: tickets_daily_rollup.sql
+-- Agregado diário de atendimentos concluídos (por tenant, dia, operador e prioridade),
+-- mantido de forma incremental ao finalizar cada senha. Os KPIs/gráficos/ranking do
+-- dashboard leem daqui em vez de varrer os tickets do período.
+
+CREATE TABLE IF NOT EXISTS tickets_daily_rollup (
+  tenant_cpf_cnpj VARCHAR(20) NOT NULL,
+  day DATE NOT NULL,                                   -- DATE(completed_at)
+  operator_id CHAR(36) NOT NULL DEFAULT '',            -- '' = sem operador
+  priority ENUM('normal','preferential') NOT NULL,
+  operator_name VARCHAR(160) NULL,                     -- Último nome visto (desnormalizado)
+
+  completed_count INT NOT NULL DEFAULT 0,
+  timed_count INT NOT NULL DEFAULT 0,                  -- Concluídos com service_started_at
+  sum_service_sec BIGINT NOT NULL DEFAULT 0,
+  min_service_sec INT NULL,
+  max_service_sec INT NULL,
+
+  PRIMARY KEY (tenant_cpf_cnpj, day, operator_id, priority),
+
+  CONSTRAINT fk_tdr_tenant
+    FOREIGN KEY (tenant_cpf_cnpj) REFERENCES tenants(cpf_cnpj) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Carga inicial a partir do histórico existente
+INSERT INTO tickets_daily_rollup
+  (tenant_cpf_cnpj, day, operator_id, priority, operator_name,
+   completed_count, timed_count, sum_service_sec, min_service_sec, max_service_sec)
+SELECT
+  tenant_cpf_cnpj, DATE(completed_at), COALESCE(operator_id, ''), priority, MAX(operator_name),
+  COUNT(*),
+  COUNT(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)),
+  COALESCE(SUM(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)), 0),
+  MIN(TIMESTAMPDIFF(SECOND, service_started_at, completed_at)),
+  MAX(TIMESTAMPDIFF(SECOND, service_started_at, completed_at))
+FROM tickets
+WHERE status = 'completed' AND completed_at IS NOT NULL
+GROUP BY tenant_cpf_cnpj, DATE(completed_at), COALESCE(operator_id, ''), priority;
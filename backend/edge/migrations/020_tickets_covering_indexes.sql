@@ -0,0 +1,5 @@
+-- Migration 020: tickets_covering_indexes.sql
+-- Índice composto para a consulta restante do dashboard sobre a tabela tickets.
+
+-- Histórico de atendimentos filtrado por operador (/tenant/dashboard/history?operator_id=...)
+CREATE INDEX idx_tickets_tenant_status_op ON tickets(tenant_cpf_cnpj, status, operator_id, completed_at);
@@ -0,0 +1,8 @@
+-- Migration 021: tickets_hourly_columns.sql
+-- Colunas geradas para o breakdown por hora do monitor ao vivo (/tenant/dashboard/live):
+-- o agrupamento passa a ser feito sobre colunas indexadas em vez de expressões por linha.
+
+ALTER TABLE tickets
+  ADD COLUMN event_date DATE GENERATED ALWAYS AS (DATE(issued_at)) STORED,
+  ADD COLUMN event_hour TINYINT GENERATED ALWAYS AS (HOUR(COALESCE(completed_at, called_at))) STORED,
+  ADD INDEX idx_tickets_tenant_hourly (tenant_cpf_cnpj, event_date, event_hour, status);
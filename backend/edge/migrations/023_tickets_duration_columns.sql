@@ -0,0 +1,11 @@
+-- Migration 023: tickets_duration_columns.sql
+-- Durações calculadas uma vez na escrita (colunas geradas) em vez de TIMESTAMPDIFF por linha
+-- a cada leitura do dashboard, do rollup diário e do histórico do operador.
+--   wait_sec:    espera (issued_at → called_at)
+--   service_sec: atendimento (service_started_at → completed_at)
+-- NULL enquanto a senha não tiver os dois instantes.
+
+ALTER TABLE tickets
+  ADD COLUMN wait_sec INT GENERATED ALWAYS AS (TIMESTAMPDIFF(SECOND, issued_at, called_at)) STORED,
+  ADD COLUMN service_sec INT GENERATED ALWAYS AS (TIMESTAMPDIFF(SECOND, service_started_at, completed_at)) STORED,
+  ADD INDEX idx_tickets_tenant_service_sec (tenant_cpf_cnpj, service_sec);
@@ -0,0 +1,11 @@
+-- Migration 024: admin_lists_indexes.sql
+-- Listas do admin (/tenant/counters, /tenant/services, /tenant/announcements) lidas já na
+-- ordem de exibição pelo índice, sem filesort. A fila de espera (posição do ticket na
+-- emissão e no /acompanhar) já usa idx_tickets_tenant_status_issued da migration 018.
+
+-- ORDER BY created_at DESC: percorrido de trás para frente
+CREATE INDEX idx_counter_tenant_created ON counters(tenant_cpf_cnpj, created_at);
+CREATE INDEX idx_service_tenant_created ON services(tenant_cpf_cnpj, created_at);
+
+-- ORDER BY position ASC, created_at DESC: direções mistas exigem a coluna DESC no índice
+CREATE INDEX idx_ta_tenant_pos_created ON tenant_announcements(tenant_cpf_cnpj, position, created_at DESC);
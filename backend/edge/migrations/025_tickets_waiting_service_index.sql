@@ -0,0 +1,6 @@
+-- Migration 025: tickets_waiting_service_index.sql
+-- Contadores da fila (/tickets/queue/stats) filtrados pelos serviços do operador.
+-- Sem filtro, o "GROUP BY priority" já é coberto por idx_tickets_tenant_waiting
+-- (tenant_cpf_cnpj, status, priority, issued_at); com "service_id IN (...)" o MySQL
+-- precisava ler cada senha da fila só para conferir o serviço.
+CREATE INDEX idx_tickets_tenant_status_svc ON tickets(tenant_cpf_cnpj, status, service_id, priority);